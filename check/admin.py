@@ -1,6 +1,9 @@
 from django.contrib import admin
-from .models import Schedule, Problem
+from .models import MemberDailyCount, MemberStats, Schedule, Problem, ProblemCatalog
 # Register your models here.
 
 admin.site.register(Schedule)
 admin.site.register(Problem)
+admin.site.register(ProblemCatalog)
+admin.site.register(MemberStats)
+admin.site.register(MemberDailyCount)
@@ -0,0 +1,226 @@
+"""
+This file is used to store the problem catalog in a compact binary snapshot opened via mmap
+
+Helper modules only, do not do and server operations
+
+the snapshot is read-only and shared by every worker process mapping it, only the looked up rows become python objects
+
+file layout: a header, then one 8-byte aligned section per column, rows are sorted by problem code
+
+- problem_code: int32, acceptance_rate: float64 (nan if unknown), difficulty: uint8 (255 if unknown)
+- problem_title and problem_slug: uint32 references into a string table (uint32 offsets + utf8 data)
+- title_index and slug_index: open addressing hash tables of uint32 row + 1 (0 is empty), keyed by crc32
+"""
+
+from array import array
+from bisect import bisect_left
+import math
+import mmap
+import os
+import struct
+import sys
+import time
+import zlib
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'LCCS'
+VERSION = 1
+# magic, version, byte order (0 little, 1 big), row count, build time, section count
+HEADER = struct.Struct('<4sIBxxxQdI')
+# offset and length in bytes of each section
+SECTION = struct.Struct('<QQ')
+SECTIONS = ['problem_code', 'problem_title', 'problem_slug', 'difficulty', 'acceptance_rate', 'string_offsets', 'string_data', 'title_index', 'slug_index']
+SECTION_FORMATS = {
+    'problem_code': 'i', 'problem_title': 'I', 'problem_slug': 'I', 'difficulty': 'B', 'acceptance_rate': 'd',
+    'string_offsets': 'I', 'string_data': 'B', 'title_index': 'I', 'slug_index': 'I',
+}
+DIFFICULTIES = ['Easy', 'Medium', 'Hard']
+UNKNOWN_DIFFICULTY = 255
+
+def __build_hash_index(keys)->array:
+    """
+    Build an open addressing hash table of row + 1 by key, the first row of a duplicated key wins
+    """
+    size = 8
+    while size < 2 * len(keys):
+        size *= 2
+    table = array('I', bytes(4 * size))
+    mask = size - 1
+    for row, key in enumerate(keys):
+        slot = zlib.crc32(key) & mask
+        while table[slot] and keys[table[slot] - 1] != key:
+            slot = (slot + 1) & mask
+        if not table[slot]:
+            table[slot] = row + 1
+    return table
+
+def write_catalog_snapshot(problems, path)->int:
+    """
+    Write catalog problems into a snapshot, the file is replaced atomically so mapped readers keep the old one
+
+    :param problems: catalog problems with problem_code, problem_title, problem_slug, difficulty and acceptance_rate
+    :type problems: Iterable[dict]
+    :param path: path of the snapshot file
+    :type path: str
+
+    :return: number of rows written
+    :rtype: int
+    """
+    problems = sorted(problems, key=lambda problem: problem['problem_code'])
+    string_ids = {}
+    strings = []
+
+    def string_id(value):
+        if value not in string_ids:
+            string_ids[value] = len(strings)
+            strings.append(value.encode('utf8'))
+        return string_ids[value]
+
+    columns = {
+        'problem_code': array('i', (problem['problem_code'] for problem in problems)),
+        'problem_title': array('I', (string_id(problem['problem_title']) for problem in problems)),
+        'problem_slug': array('I', (string_id(problem['problem_slug']) for problem in problems)),
+        'difficulty': array('B', (
+            DIFFICULTIES.index(problem['difficulty']) if problem['difficulty'] in DIFFICULTIES else UNKNOWN_DIFFICULTY
+            for problem in problems
+        )),
+        'acceptance_rate': array('d', (
+            math.nan if problem['acceptance_rate'] is None else problem['acceptance_rate']
+            for problem in problems
+        )),
+    }
+    string_offsets = array('I', [0])
+    for value in strings:
+        string_offsets.append(string_offsets[-1] + len(value))
+    columns['string_offsets'] = string_offsets
+    columns['string_data'] = b''.join(strings)
+    columns['title_index'] = __build_hash_index([strings[string_ids[problem['problem_title']]] for problem in problems])
+    columns['slug_index'] = __build_hash_index([strings[string_ids[problem['problem_slug']]] for problem in problems])
+
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'wb') as file:
+        offset = HEADER.size + SECTION.size * len(SECTIONS)
+        section_table = []
+        payloads = []
+        for name in SECTIONS:
+            payload = bytes(columns[name]) if name == 'string_data' else columns[name].tobytes()
+            offset += -offset % 8
+            section_table.append((offset, len(payload)))
+            payloads.append((offset, payload))
+            offset += len(payload)
+        file.write(HEADER.pack(MAGIC, VERSION, 0 if sys.byteorder == 'little' else 1, len(problems), time.time(), len(SECTIONS)))
+        for section_offset, length in section_table:
+            file.write(SECTION.pack(section_offset, length))
+        for section_offset, payload in payloads:
+            file.write(b'\0' * (section_offset - file.tell()))
+            file.write(payload)
+    os.replace(temporary_path, path)
+    logger.info(f'Wrote problem catalog snapshot of {len(problems)} problems to {path}')
+    return len(problems)
+
+class CatalogSnapshot:
+    """
+    Read-only view of a problem catalog snapshot, columns are memory-mapped and never loaded as python objects
+    """
+
+    def __init__(self, path):
+        """
+        Open the snapshot
+
+        :param path: path of the snapshot file
+        :type path: str
+
+        :raises ValueError: If the file is not a snapshot of this version and byte order
+        """
+        self.file = open(path, 'rb')
+        self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, byte_order, count, built_at, section_count = HEADER.unpack_from(self.mmap, 0)
+        if magic != MAGIC or version != VERSION or section_count != len(SECTIONS):
+            self.close()
+            raise ValueError(f'Invalid problem catalog snapshot: {path}')
+        if byte_order != (0 if sys.byteorder == 'little' else 1):
+            self.close()
+            raise ValueError(f'Problem catalog snapshot {path} was written with another byte order')
+        self.count = count
+        # unix time the snapshot was written at
+        self.built_at = built_at
+        buffer = memoryview(self.mmap)
+        self.columns = {}
+        for index, name in enumerate(SECTIONS):
+            offset, length = SECTION.unpack_from(self.mmap, HEADER.size + SECTION.size * index)
+            self.columns[name] = buffer[offset:offset + length].cast(SECTION_FORMATS[name])
+
+    def close(self):
+        # views must be released before the mmap can be closed
+        for column in getattr(self, 'columns', {}).values():
+            column.release()
+        self.columns = {}
+        self.mmap.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def _string_bytes(self, string_id)->bytes:
+        offsets = self.columns['string_offsets']
+        return bytes(self.columns['string_data'][offsets[string_id]:offsets[string_id + 1]])
+
+    def row(self, row)->dict:
+        difficulty = self.columns['difficulty'][row]
+        acceptance_rate = self.columns['acceptance_rate'][row]
+        return {
+            'problem_code': self.columns['problem_code'][row],
+            'problem_title': self._string_bytes(self.columns['problem_title'][row]).decode('utf8'),
+            'problem_slug': self._string_bytes(self.columns['problem_slug'][row]).decode('utf8'),
+            'difficulty': DIFFICULTIES[difficulty] if difficulty < len(DIFFICULTIES) else None,
+            'acceptance_rate': None if math.isnan(acceptance_rate) else acceptance_rate,
+        }
+
+    def find_code(self, problem_code)->int:
+        """
+        Find a problem by code with a binary search
+
+        :return: row of the problem, None if not in the snapshot
+        :rtype: int or None
+        """
+        codes = self.columns['problem_code']
+        row = bisect_left(codes, problem_code)
+        if row < self.count and codes[row] == problem_code:
+            return row
+        return None
+
+    def _find_string(self, index_name, column_name, value)->int:
+        table = self.columns[index_name]
+        column = self.columns[column_name]
+        target = value.encode('utf8')
+        mask = len(table) - 1
+        slot = zlib.crc32(target) & mask
+        while table[slot]:
+            row = table[slot] - 1
+            if self._string_bytes(column[row]) == target:
+                return row
+            slot = (slot + 1) & mask
+        return None
+
+    def find_title(self, problem_title)->int:
+        """
+        :return: row of the first problem with this title, None if not in the snapshot
+        :rtype: int or None
+        """
+        return self._find_string('title_index', 'problem_title', problem_title)
+
+    def find_slug(self, problem_slug)->int:
+        """
+        :return: row of the first problem with this slug, None if not in the snapshot
+        :rtype: int or None
+        """
+        return self._find_string('slug_index', 'problem_slug', problem_slug)
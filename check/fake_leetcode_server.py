@@ -0,0 +1,279 @@
+"""
+This file is a local stand-in of the leetcode GraphQL api, used to exercise LeetcodeScraper without network
+
+Helper modules only, do not do and server operations
+"""
+
+import csv
+import gzip
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+from pathlib import Path
+import random
+import re
+import threading
+import time
+import zlib
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+COUNTRIES = [('US', 'United States'), ('CN', 'China'), ('IN', 'India'), ('CA', 'Canada'), ('DE', 'Germany'), ('JP', 'Japan')]
+
+def load_problems()->list[dict]:
+    """
+    Load the problems from static/leetcode_problem.csv, so synthetic data matches the catalog
+
+    :return: problems in the shape of the problem set listing, slugs are guessed from the titles
+    :rtype: list[dict]
+    """
+    problems = []
+    with open(os.path.join(BASE_DIR, 'static/leetcode_problem.csv'), 'r') as file:
+        reader = csv.reader(file)
+        next(reader, None)
+        for row in reader:
+            # titles with a comma are not quoted, and some rows swap difficulty and acceptance rate
+            title = ','.join(row[1:-2])
+            difficulty, acceptance_rate = sorted(row[-2:], key=lambda value: value.endswith('%'))
+            problems.append({
+                'acRate': float(acceptance_rate.rstrip('%')),
+                'difficulty': difficulty,
+                'frontendQuestionId': row[0],
+                'paidOnly': False,
+                'title': title,
+                'titleSlug': re.sub(r'[^a-z0-9]+', '-', title.lower()).strip('-'),
+            })
+    return problems
+
+def load_problem_titles()->list[tuple[str, str]]:
+    """
+    Load the problem titles from static/leetcode_problem.csv, so synthetic submissions match the catalog
+
+    :return: list of (title, guessed slug)
+    :rtype: list[tuple[str, str]]
+    """
+    return [(problem['title'], problem['titleSlug']) for problem in load_problems()]
+
+class FakeLeetcodeServer:
+    """
+    Fake leetcode GraphQL server with synthetic users
+
+    supports the operations sent by LeetcodeScraper, including the problem set listing,
+    with configurable latency, 5xx error rate and 429 rate
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, error_rate=0.0, throttle_rate=0.0, total_users=10000, users_per_page=25, submissions_per_user=15, seed=0, retry_after=None):
+        """
+        Initialize the FakeLeetcodeServer
+
+        :param host: host to bind
+        :type host: str
+        :param port: port to bind, any free port if 0
+        :type port: int
+        :param latency: mean seconds to wait before answering
+        :type latency: float
+        :param error_rate: fraction of requests answered with 500
+        :type error_rate: float
+        :param throttle_rate: fraction of requests answered with 429
+        :type throttle_rate: float
+        :param total_users: number of users in the global ranking
+        :type total_users: int
+        :param users_per_page: number of users per global ranking page
+        :type users_per_page: int
+        :param submissions_per_user: number of recent ac submissions of each synthetic user
+        :type submissions_per_user: int
+        :param seed: seed of the synthetic data
+        :type seed: int
+        :param retry_after: seconds sent in the Retry-After header of 429 responses, no header if None
+        :type retry_after: float or None
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.total_users = total_users
+        self.users_per_page = users_per_page
+        self.submissions_per_user = submissions_per_user
+        self.seed = seed
+        self.retry_after = retry_after
+        # problem set listing, may be edited while serving to simulate new and changed problems
+        self.problems = load_problems()
+        self.problem_titles = [(problem['title'], problem['titleSlug']) for problem in self.problems]
+        self.counters = {'requests': 0, 'errors': 0, 'throttled': 0}
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}/graphql'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def reset_counters(self):
+        with self._lock:
+            self.counters = {counter: 0 for counter in self.counters}
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.counters)
+
+    # synthetic data
+
+    def recent_ac_submissions(self, username, limit):
+        user_random = random.Random(f'{self.seed}-{username}')
+        base_id = user_random.randrange(10**8, 10**9)
+        now = int(time.time())
+        submissions = []
+        for index in range(min(limit, self.submissions_per_user)):
+            title, slug = user_random.choice(self.problem_titles)
+            submissions.append({
+                'id': str(base_id - index),
+                'title': title,
+                'titleSlug': slug,
+                'timestamp': str(now - index * user_random.randrange(600, 86400)),
+            })
+        return submissions
+
+    def global_ranking(self, page_num):
+        first_rank = (page_num - 1) * self.users_per_page + 1
+        last_rank = min(self.total_users, first_rank + self.users_per_page - 1)
+        ranking_nodes = []
+        for rank in range(first_rank, last_rank + 1):
+            country_code, country_name = COUNTRIES[rank % len(COUNTRIES)]
+            ranking_nodes.append({
+                'ranking': rank,
+                'currentRating': round(3500 - 2000 * rank / self.total_users, 2),
+                'currentGlobalRanking': rank,
+                'dataRegion': 'CN' if country_code == 'CN' else 'US',
+                'user': {
+                    'username': f'user{rank}',
+                    'nameColor': None,
+                    'activeBadge': None,
+                    'profile': {
+                        'userAvatar': '',
+                        'countryCode': country_code,
+                        'countryName': country_name,
+                        'realName': f'User {rank}',
+                    },
+                },
+            })
+        return {'totalUsers': self.total_users, 'userPerPage': self.users_per_page, 'rankingNodes': ranking_nodes}
+
+    def profile_operation(self, operation, username):
+        if operation == 'userContestRankingInfo':
+            return {'userContestRanking': None, 'userContestRankingHistory': []}
+        if operation == 'userProblemsSolved':
+            return {
+                'allQuestionsCount': [{'difficulty': 'All', 'count': len(self.problem_titles)}],
+                'matchedUser': {'problemsSolvedBeatsStats': [], 'submitStatsGlobal': {'acSubmissionNum': []}},
+            }
+        return {'matchedUser': {'username': username}}
+
+    def answer(self, json_data):
+        """
+        Answer a GraphQL request body
+
+        :return: http status and response body
+        :rtype: tuple[int, dict]
+        """
+        operation = json_data.get('operationName')
+        variables = json_data.get('variables') or {}
+        query = json_data.get('query', '')
+        if operation == 'recentAcSubmissions':
+            return 200, {'data': {'recentAcSubmissionList': self.recent_ac_submissions(variables['username'], variables['limit'])}}
+        if operation == 'recentAcSubmissionsBatch':
+            data = {}
+            for name, username in variables.items():
+                if name.startswith('username'):
+                    data[f'user{name[len("username"):]}'] = self.recent_ac_submissions(username, variables['limit'])
+            return 200, {'data': data}
+        if operation == 'problemsetQuestionList':
+            skip, limit = variables.get('skip') or 0, variables.get('limit') or 50
+            questions = self.problems[skip:skip + limit]
+            return 200, {'data': {'problemsetQuestionList': {'total': len(self.problems), 'questions': questions}}}
+        if operation is not None and 'username' in variables:
+            return 200, {'data': self.profile_operation(operation, variables['username'])}
+        match = re.search(r'globalRanking\(page: (\d+)\)', query)
+        if match:
+            return 200, {'data': {'globalRanking': self.global_ranking(int(match.group(1)))}}
+        return 400, {'errors': [{'message': f'Unsupported operation: {operation}'}]}
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # keep-alive, so the client connection pool is exercised
+            protocol_version = 'HTTP/1.1'
+            # headers and body are written separately, avoid the nagle and delayed ack stall between them
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                with server._lock:
+                    server.counters['requests'] += 1
+                    roll = server._random.random()
+                    delay = server._random.expovariate(1 / server.latency) if server.latency > 0 else 0
+                if delay:
+                    time.sleep(delay)
+                if roll < server.throttle_rate:
+                    with server._lock:
+                        server.counters['throttled'] += 1
+                    headers = {} if server.retry_after is None else {'Retry-After': str(server.retry_after)}
+                    return self.reply(429, {'errors': [{'message': 'Too many requests'}]}, headers)
+                if roll < server.throttle_rate + server.error_rate:
+                    with server._lock:
+                        server.counters['errors'] += 1
+                    return self.reply(500, {'errors': [{'message': 'Internal server error'}]})
+                try:
+                    status, payload = server.answer(json.loads(body))
+                except (ValueError, KeyError) as e:
+                    status, payload = 400, {'errors': [{'message': str(e)}]}
+                self.reply(status, payload)
+
+            def reply(self, status, payload, headers=None):
+                content = json.dumps(payload).encode('utf8')
+                encoding = self.headers.get('Accept-Encoding', '')
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                if 'gzip' in encoding:
+                    content = gzip.compress(content)
+                    self.send_header('Content-Encoding', 'gzip')
+                elif 'deflate' in encoding:
+                    content = zlib.compress(content)
+                    self.send_header('Content-Encoding', 'deflate')
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        return Handler
+
+if __name__ == '__main__':
+    port = int(input('Enter port to serve the fake leetcode api: ') or 8080)
+    with FakeLeetcodeServer(port=port) as fake_server:
+        print(f'Serving fake leetcode api on {fake_server.url}')
+        fake_server.thread.join()
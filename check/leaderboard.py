@@ -0,0 +1,507 @@
+"""
+This file is used to rank the members by their ac problems, shared by the benchmark views
+"""
+
+from collections import Counter
+from datetime import datetime, time, timedelta
+import heapq
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Exists, Max, Min, OuterRef, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from check.models import MemberDailyCount, MemberStats, Problem, ProblemStatusChoices
+from member.models import Member, ServerOperationChoices, ServerOperations
+
+# import logging
+import logging
+logger = logging.getLogger(__name__)
+
+# unix time of the last write to the ranked data
+LEADERBOARD_VERSION_CACHE_KEY = 'check:leaderboard_version'
+# seconds a version is kept, forever in a shared cache, so etags only change with the data,
+# with a per process cache the writes of other processes are only seen once it expires
+LEADERBOARD_VERSION_TIMEOUT = 300 if settings.CACHES['default']['BACKEND'].endswith('.LocMemCache') else None
+
+# days of each ranking window, counted back from today, None for all time
+LEADERBOARD_WINDOWS = {
+    'daily': 1,
+    'weekly': 7,
+    'all_time': None,
+}
+
+def window_start(days:Optional[int], today=None)->Optional[datetime]:
+    """
+    Get the first instant of a ranking window, the local midnight days before today
+
+    :param days: days of the window, None for all time
+    :type days: int or None
+    :param today: local date the window ends on, today if not given
+    :type today: date or None
+
+    :return: aware start of the window, None for all time
+    :rtype: datetime or None
+    """
+    if days is None:
+        return None
+    today = today or timezone.localdate()
+    return timezone.make_aware(datetime.combine(today - timedelta(days=days), time.min))
+
+def get_leaderboard_version()->float:
+    """
+    Get the version of the data shown on the benchmark page, the time of the last write to it
+
+    :return: unix time of the last write, or of the first call since the version expired
+    :rtype: float
+    """
+    version = cache.get(LEADERBOARD_VERSION_CACHE_KEY)
+    if version is None:
+        cache.add(LEADERBOARD_VERSION_CACHE_KEY, timezone.now().timestamp(), LEADERBOARD_VERSION_TIMEOUT)
+        version = cache.get(LEADERBOARD_VERSION_CACHE_KEY)
+    return version
+
+def bump_leaderboard_version()->None:
+    """
+    Mark the data shown on the benchmark page as changed, call it after every committed write to it
+    """
+    cache.set(LEADERBOARD_VERSION_CACHE_KEY, timezone.now().timestamp(), LEADERBOARD_VERSION_TIMEOUT)
+
+def __annotate_window_counts(members, difficulty:Optional[str], today):
+    """
+    Annotate members with their ac problems in every window, name_count, and their latest ac time, last_ac_time
+    """
+    ac_filter = Q(schedule__problem__status=ProblemStatusChoices.AC)
+    counted_filter = ac_filter & Q(schedule__problem__catalog_id__difficulty=difficulty) if difficulty else ac_filter
+    annotations = {}
+    for name, days in LEADERBOARD_WINDOWS.items():
+        start = window_start(days, today)
+        window_filter = counted_filter if start is None else counted_filter & Q(schedule__problem__done_date__gte=start)
+        annotations[f'{name}_count'] = Count('schedule__problem', filter=window_filter)
+    return members.annotate(last_ac_time=Max('schedule__problem__done_date', filter=ac_filter), **annotations)
+
+def __rank(rows, member_of)->dict:
+    """
+    Rank rows carrying name_count and last_ac_time attributes into every window
+
+    :return: window name to ranking, entries have user, AC_count and last_submission_time, sorted by AC_count
+    :rtype: dict[str, list[dict]]
+    """
+    leaderboards = {name: [] for name in LEADERBOARD_WINDOWS}
+    for row in rows:
+        member = member_of(row)
+        for name in LEADERBOARD_WINDOWS:
+            ac_count = getattr(row, f'{name}_count')
+            if ac_count:
+                leaderboards[name].append({
+                    "user": member,
+                    "AC_count": ac_count,
+                    # members without a dated ac problem fall back to their join date
+                    "last_submission_time": row.last_ac_time or member.date_joined,
+                })
+    for ranking in leaderboards.values():
+        ranking.sort(key=lambda entry: entry['AC_count'], reverse=True)
+    logger.info(f"Ranked {len(leaderboards['all_time'])} members, {len(leaderboards['weekly'])} this week, {len(leaderboards['daily'])} today")
+    return leaderboards
+
+def get_leaderboards(difficulty:Optional[str]=None, today=None)->dict:
+    """
+    Rank the non staff members by ac problems within every window of LEADERBOARD_WINDOWS
+
+    all windows are counted by one grouped query with conditional aggregation, joined to the user,
+    so the cost does not depend on the number of members
+
+    :param difficulty: only count the problems of this difficulty, all problems if not given
+    :type difficulty: str or None
+    :param today: local date the windows end on, today if not given
+    :type today: date or None
+
+    :return: window name to ranking, entries have user, AC_count and last_submission_time, sorted by AC_count
+    :rtype: dict[str, list[dict]]
+    """
+    members = __annotate_window_counts(
+        Member.objects.filter(user_id__is_staff=False).select_related('user_id'), difficulty, today,
+    ).filter(all_time_count__gt=0).order_by('id')
+    return __rank(members, lambda member: member)
+
+def __sum_daily_counts(days:int, today, members=None)->dict:
+    """
+    Sum the daily counts of a window, only the buckets of the window are read
+
+    :param days: days of the window, counted back from today like window_start
+    :type days: int
+    :param today: local date the window ends on
+    :type today: date
+    :param members: only sum the counts of these members, all members if not given
+    :type members: QuerySet[Member] or None
+
+    :return: member id to ac problems in the window, members without any are left out
+    :rtype: dict[int, int]
+    """
+    buckets = MemberDailyCount.objects.filter(day__gte=today - timedelta(days=days))
+    if members is not None:
+        buckets = buckets.filter(member_id__in=members)
+    return dict(buckets.values('member_id').annotate(window_count=Sum('count')).values_list('member_id', 'window_count'))
+
+def __roll_member_stats(stats:list, today)->None:
+    """
+    Count the windows of stats counted for an earlier day again from the daily counts, without reading the problems
+    """
+    members = [row.member_id_id for row in stats]
+    for name, days in LEADERBOARD_WINDOWS.items():
+        if days is None:
+            continue
+        counts = __sum_daily_counts(days, today, members)
+        for row in stats:
+            setattr(row, f'{name}_count', counts.get(row.member_id_id, 0))
+    for row in stats:
+        row.computed_for = today
+
+def __build_missing_member_stats(today)->None:
+    # members with ac problems but no stats row yet, e.g. while other members got theirs from record_ac_problems
+    members = Member.objects.filter(
+        ~Exists(MemberStats.objects.filter(member_id=OuterRef('pk'))),
+        Exists(Problem.objects.filter(schedule_id__member_id=OuterRef('pk'), status=ProblemStatusChoices.AC)),
+    )
+    member_ids = list(members.values_list('id', flat=True))
+    if not member_ids:
+        return
+    members = Member.objects.filter(id__in=member_ids)
+    with transaction.atomic():
+        __save_daily_counts(members, __count_daily_counts(members))
+        # a row created meanwhile by record_ac_problems is newer, keep it
+        MemberStats.objects.bulk_create(__count_member_stats(members, today).values(), batch_size=1000, ignore_conflicts=True)
+    bump_leaderboard_version()
+    logger.info(f"Built the missing member stats of {len(member_ids)} members")
+
+def __refresh_member_stats(today)->None:
+    # build the stats of members without any yet, roll their windows over from the daily counts if counted for an earlier day
+    __build_missing_member_stats(today)
+    oldest = MemberStats.objects.aggregate(oldest=Min('computed_for'))['oldest']
+    if oldest is not None and oldest < today:
+        with transaction.atomic():
+            stats = list(MemberStats.objects.select_for_update().filter(computed_for__lt=today))
+            __roll_member_stats(stats, today)
+            MemberStats.objects.bulk_update(stats, ['computed_for', *WINDOW_STATS_FIELDS], batch_size=1000)
+        logger.info(f"Rolled the windows of {len(stats)} member stats over to {today}")
+
+def refresh_member_stats(today=None)->None:
+    """
+    Bring the MemberStats rows up to date for today, build the missing ones and roll stale windows over
+
+    the version may be bumped, read it after the refresh when it tags what is served from the stats
+
+    :param today: local date the windows end on, today if not given
+    :type today: date or None
+    """
+    __refresh_member_stats(today or timezone.localdate())
+
+def get_stats_leaderboards(today=None)->dict:
+    """
+    Rank the non staff members from their MemberStats rows, same result as get_leaderboards without a difficulty
+
+    the stats of members without a row are built first, and windows counted for an earlier day are rolled over
+
+    :param today: local date the windows end on, today if not given
+    :type today: date or None
+
+    :return: window name to ranking, entries have user, AC_count and last_submission_time, sorted by AC_count
+    :rtype: dict[str, list[dict]]
+    """
+    today = today or timezone.localdate()
+    __refresh_member_stats(today)
+    stats = (
+        MemberStats.objects
+        .filter(member_id__user_id__is_staff=False, all_time_count__gt=0)
+        .select_related('member_id__user_id')
+        .order_by('member_id')
+    )
+    return __rank(stats, lambda row: row.member_id)
+
+def get_leaderboard_page(window:str, difficulty:Optional[str]=None, after:Optional[tuple]=None, limit:int=50, today=None)->tuple:
+    """
+    Get one page of a ranking window, ordered like get_leaderboards, with keyset pagination
+
+    pages are read from the MemberStats rows, or counted from the problems when ranking one difficulty
+
+    :param window: name of a window of LEADERBOARD_WINDOWS
+    :type window: str
+    :param difficulty: only count the problems of this difficulty, all problems if not given
+    :type difficulty: str or None
+    :param after: (AC_count, member id, rank) of the last entry of the previous page, None for the first page
+    :type after: tuple[int, int, int] or None
+    :param limit: max entries of the page
+    :type limit: int
+    :param today: local date the windows end on, today if not given
+    :type today: date or None
+
+    :return: entries with rank, user, AC_count and last_submission_time, and the after key of the next page or None
+    :rtype: tuple[list[dict], Optional[tuple[int, int, int]]]
+    """
+    today = today or timezone.localdate()
+    count_field = f'{window}_count'
+    if difficulty:
+        rows = __annotate_window_counts(Member.objects.filter(user_id__is_staff=False).select_related('user_id'), difficulty, today)
+        member_field = 'id'
+        member_of = lambda row: row
+    else:
+        __refresh_member_stats(today)
+        rows = MemberStats.objects.filter(member_id__user_id__is_staff=False).select_related('member_id__user_id')
+        member_field = 'member_id'
+        member_of = lambda row: row.member_id
+    rows = rows.filter(**{f'{count_field}__gt': 0})
+    rank = 0
+    if after is not None:
+        ac_count, member_id, rank = after
+        rows = rows.filter(Q(**{f'{count_field}__lt': ac_count}) | Q(**{count_field: ac_count, f'{member_field}__gt': member_id}))
+    rows = list(rows.order_by(f'-{count_field}', member_field)[:limit + 1])
+    entries = []
+    for row in rows[:limit]:
+        member = member_of(row)
+        rank += 1
+        entries.append({
+            "rank": rank,
+            "user": member,
+            "AC_count": getattr(row, count_field),
+            # members without a dated ac problem fall back to their join date
+            "last_submission_time": row.last_ac_time or member.date_joined,
+        })
+    next_after = None
+    if len(rows) > limit:
+        next_after = (entries[-1]['AC_count'], entries[-1]['user'].id, rank)
+    return entries, next_after
+
+def get_days_leaderboard_page(days:int, after:Optional[tuple]=None, limit:int=50, today=None)->tuple:
+    """
+    Get one page of the ranking of an arbitrary window of days, summed from the daily counts
+
+    costs O(members x days) whatever the history, the page is taken with a heap instead of sorting every member
+
+    :param days: days of the window, counted back from today like window_start
+    :type days: int
+    :param after: (AC_count, member id, rank) of the last entry of the previous page, None for the first page
+    :type after: tuple[int, int, int] or None
+    :param limit: max entries of the page
+    :type limit: int
+    :param today: local date the window ends on, today if not given
+    :type today: date or None
+
+    :return: entries with rank, user, AC_count and last_submission_time, and the after key of the next page or None
+    :rtype: tuple[list[dict], Optional[tuple[int, int, int]]]
+    """
+    today = today or timezone.localdate()
+    counts = __sum_daily_counts(days, today, Member.objects.filter(user_id__is_staff=False))
+    # ordered like get_leaderboard_page, by count then member id
+    keys = ((-ac_count, member_id) for member_id, ac_count in counts.items())
+    rank = 0
+    if after is not None:
+        ac_count, member_id, rank = after
+        keys = (key for key in keys if key > (-ac_count, member_id))
+    top = heapq.nsmallest(limit + 1, keys)
+    page_member_ids = [member_id for _, member_id in top[:limit]]
+    members = Member.objects.select_related('user_id').in_bulk(page_member_ids)
+    # the daily counts may be written before the stats rows are built, members without one fall back to their join date
+    last_ac_times = dict(MemberStats.objects.filter(member_id__in=page_member_ids).values_list('member_id', 'last_ac_time'))
+    entries = []
+    for negative_count, member_id in top[:limit]:
+        member = members[member_id]
+        rank += 1
+        entries.append({
+            "rank": rank,
+            "user": member,
+            "AC_count": -negative_count,
+            "last_submission_time": last_ac_times.get(member_id) or member.date_joined,
+        })
+    next_after = None
+    if len(top) > limit:
+        next_after = (entries[-1]['AC_count'], entries[-1]['user'].id, rank)
+    return entries, next_after
+
+def __streak(days:list)->tuple:
+    """
+    Get the run of consecutive days ending on the latest one
+
+    :param days: distinct local dates, sorted
+    :type days: list[date]
+
+    :return: streak length and its last date
+    :rtype: tuple[int, Optional[date]]
+    """
+    if not days:
+        return 0, None
+    streak_days = 1
+    for index in range(len(days) - 1, 0, -1):
+        if days[index] - days[index - 1] != timedelta(days=1):
+            break
+        streak_days += 1
+    return streak_days, days[-1]
+
+def __count_member_stats(members, today)->dict:
+    """
+    Count the stats of members from scratch
+
+    :return: member id to unsaved MemberStats
+    :rtype: dict[int, MemberStats]
+    """
+    stats = {}
+    for member in __annotate_window_counts(members, None, today).values('id', 'last_ac_time', *(f'{name}_count' for name in LEADERBOARD_WINDOWS)):
+        member_id = member.pop('id')
+        stats[member_id] = MemberStats(member_id_id=member_id, computed_for=today, **member)
+    ac_days = {}
+    for member_id, day in (
+        Problem.objects
+        .filter(schedule_id__member_id__in=members, status=ProblemStatusChoices.AC, done_date__isnull=False)
+        .annotate(day=TruncDate('done_date'))
+        .values_list('schedule_id__member_id', 'day')
+        .distinct()
+    ):
+        ac_days.setdefault(member_id, []).append(day)
+    for member_id, days in ac_days.items():
+        stats[member_id].streak_days, stats[member_id].streak_last_date = __streak(sorted(days))
+    return stats
+
+def __count_daily_counts(members)->dict:
+    """
+    Count the daily counts of members from scratch
+
+    :return: (member id, local date) to ac problems done that day
+    :rtype: dict[tuple[int, date], int]
+    """
+    return {
+        (row['schedule_id__member_id'], row['day']): row['day_count']
+        for row in (
+            Problem.objects
+            .filter(schedule_id__member_id__in=members, status=ProblemStatusChoices.AC, done_date__isnull=False)
+            .annotate(day=TruncDate('done_date'))
+            .values('schedule_id__member_id', 'day')
+            .annotate(day_count=Count('id'))
+            .order_by()
+        )
+    }
+
+def __save_daily_counts(members, counted:dict)->None:
+    # replace the daily counts of members by counted ones
+    MemberDailyCount.objects.filter(member_id__in=members).delete()
+    MemberDailyCount.objects.bulk_create(
+        [MemberDailyCount(member_id_id=member_id, day=day, count=count) for (member_id, day), count in counted.items()],
+        batch_size=1000,
+    )
+
+def __add_daily_counts(member, done_dates:list)->None:
+    # two queries whatever the number of days, the caller holds the lock on the stats row of the member
+    added = Counter(timezone.localdate(done_date) for done_date in done_dates if done_date is not None)
+    if not added:
+        return
+    counts = dict(MemberDailyCount.objects.filter(member_id=member, day__in=list(added)).values_list('day', 'count'))
+    MemberDailyCount.objects.bulk_create(
+        [MemberDailyCount(member_id=member, day=day, count=counts.get(day, 0) + count) for day, count in added.items()],
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['member_id', 'day'],
+        update_fields=['count'],
+    )
+
+def record_ac_problems(member, done_dates:list)->None:
+    """
+    Add new ac problems of a member to its MemberStats and daily counts, call it in the transaction that saved the problems
+
+    stats counted for an earlier day are rolled over from the daily counts,
+    ac problems older than the current streak make the member be counted again from scratch
+
+    :param member: member
+    :type member: Member
+    :param done_dates: done dates of the new ac problems
+    :type done_dates: list[datetime]
+    """
+    if not done_dates:
+        return
+    today = timezone.localdate()
+    stats = MemberStats.objects.select_for_update().filter(member_id=member).first()
+    days = sorted({timezone.localdate(done_date) for done_date in done_dates if done_date is not None})
+    if stats is None or (days and stats.streak_last_date is not None and days[0] < stats.streak_last_date):
+        members = Member.objects.filter(id=member.id)
+        __save_daily_counts(members, __count_daily_counts(members))
+        stats = __count_member_stats(members, today)[member.id]
+        stats.save()
+        return
+    __add_daily_counts(member, done_dates)
+    stats.all_time_count += len(done_dates)
+    if stats.computed_for != today:
+        # the daily counts already hold the new problems
+        __roll_member_stats([stats], today)
+    else:
+        for name, days_back in LEADERBOARD_WINDOWS.items():
+            start = window_start(days_back, today)
+            if start is not None:
+                added = sum(1 for done_date in done_dates if done_date is not None and done_date >= start)
+                setattr(stats, f'{name}_count', getattr(stats, f'{name}_count') + added)
+    stats.last_ac_time = max([done_date for done_date in done_dates if done_date is not None] + ([stats.last_ac_time] if stats.last_ac_time else []), default=None)
+    for day in days:
+        if stats.streak_last_date is not None and day == stats.streak_last_date + timedelta(days=1):
+            stats.streak_days += 1
+        elif stats.streak_last_date is None or day > stats.streak_last_date:
+            stats.streak_days = 1
+        stats.streak_last_date = max(day, stats.streak_last_date or day)
+    stats.save()
+
+# fields compared by the reconcile task, the window counts only when both sides are counted for the same day
+STATS_FIELDS = ['all_time_count', 'last_ac_time', 'streak_days', 'streak_last_date']
+WINDOW_STATS_FIELDS = [f'{name}_count' for name in LEADERBOARD_WINDOWS if name != 'all_time']
+
+def rebuild_member_stats(today=None)->dict:
+    """
+    Rebuild the MemberStats and daily counts of every member from scratch and report the rows that drifted from the problems
+
+    :param today: local date the windows end on, today if not given
+    :type today: date or None
+
+    :return: number of members, drifted rows and drifted rows per field
+    :rtype: dict
+    """
+    today = today or timezone.localdate()
+    with transaction.atomic():
+        stored = {stats.member_id_id: stats for stats in MemberStats.objects.select_for_update()}
+        counted = __count_member_stats(Member.objects.all(), today)
+        drift = {field: 0 for field in WINDOW_STATS_FIELDS + STATS_FIELDS + ['daily_counts']}
+        drifted = set()
+        for member_id, stats in counted.items():
+            old = stored.get(member_id)
+            if old is None:
+                if stats.all_time_count:
+                    drifted.add(member_id)
+                continue
+            fields = STATS_FIELDS + (WINDOW_STATS_FIELDS if old.computed_for == today else [])
+            changed = [field for field in fields if getattr(old, field) != getattr(stats, field)]
+            for field in changed:
+                drift[field] += 1
+            if changed:
+                drifted.add(member_id)
+        stored_daily_counts = {(row.member_id_id, row.day): row.count for row in MemberDailyCount.objects.all()}
+        counted_daily_counts = __count_daily_counts(Member.objects.all())
+        # members with a missing, extra or wrong daily count
+        daily_counts_drifted = {
+            member_id for member_id, day in stored_daily_counts.keys() | counted_daily_counts.keys()
+            if stored_daily_counts.get((member_id, day)) != counted_daily_counts.get((member_id, day))
+        }
+        drift['daily_counts'] = len(daily_counts_drifted)
+        drifted = len(drifted | daily_counts_drifted)
+        MemberStats.objects.bulk_create(
+            counted.values(),
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['member_id'],
+            update_fields=['computed_for', 'last_ac_time', 'streak_days', 'streak_last_date', *(f'{name}_count' for name in LEADERBOARD_WINDOWS)],
+        )
+        if drift['daily_counts']:
+            __save_daily_counts(Member.objects.all(), counted_daily_counts)
+    result = {'members': len(counted), 'drifted': drifted, 'drift': {field: count for field, count in drift.items() if count}}
+    if drifted:
+        bump_leaderboard_version()
+        logger.warning(f"Member stats drifted from the problems: {result}")
+        ServerOperations.objects.create(operation_name=ServerOperationChoices.UPDATE_BENCHMARK, message=f"Reconciled member stats, {drifted} of {len(counted)} rows drifted: {result['drift']}")
+    else:
+        logger.info(f"Member stats reconciled without drift for {len(counted)} members")
+    return result
@@ -0,0 +1,163 @@
+"""
+This file is used to push the ranking changes of the benchmark page to browsers as server-sent events
+
+one hub per ASGI worker process polls the leaderboard version, a cache read, instead of every client polling the page,
+and on a change ranks the members once, diffs the rankings and broadcasts the serialized delta to all subscribers
+"""
+
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+
+from check.leaderboard import get_leaderboard_version, get_stats_leaderboards
+
+# import logging
+import logging
+logger = logging.getLogger(__name__)
+
+# seconds between two reads of the leaderboard version while clients are connected
+LEADERBOARD_STREAM_POLL_INTERVAL = 2
+# frames a client may lag behind before it is sent a full snapshot instead
+LEADERBOARD_STREAM_QUEUE_SIZE = 16
+
+def serialize_leaderboards(leaderboards:dict)->dict:
+    """
+    Serialize rankings for the stream
+
+    :param leaderboards: window name to ranking, as returned by get_stats_leaderboards
+    :type leaderboards: dict[str, list[dict]]
+
+    :return: window name to member id to entry with rank, username, ac_count and last_submission_time
+    :rtype: dict[str, dict[int, dict]]
+    """
+    return {
+        name: {
+            entry['user'].id: {
+                'member_id': entry['user'].id,
+                'rank': rank,
+                'username': entry['user'].user_id.username,
+                'ac_count': entry['AC_count'],
+                'last_submission_time': entry['last_submission_time'].isoformat(),
+            }
+            for rank, entry in enumerate(ranking, start=1)
+        }
+        for name, ranking in leaderboards.items()
+    }
+
+def diff_leaderboards(previous:dict, current:dict)->dict:
+    """
+    Get the members whose entry changed or who left each window
+
+    :return: window name to changed entries and removed member ids, windows without changes are left out
+    :rtype: dict[str, dict]
+    """
+    delta = {}
+    for name, entries in current.items():
+        old_entries = previous.get(name, {})
+        changed = [entry for member_id, entry in entries.items() if old_entries.get(member_id) != entry]
+        removed = [member_id for member_id in old_entries if member_id not in entries]
+        if changed or removed:
+            delta[name] = {'changed': changed, 'removed': removed}
+    return delta
+
+def _sse_frame(event:str, event_id:int, data)->bytes:
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode('utf8')
+
+def _ranked_state()->tuple:
+    # the windows move at local midnight even without writes
+    key = (get_leaderboard_version(), timezone.localdate())
+    return key, serialize_leaderboards(get_stats_leaderboards(key[1]))
+
+class LeaderboardHub:
+    """
+    Fan-out of the ranking changes of one process, frames are serialized once and shared by all subscribers
+    """
+
+    def __init__(self, poll_interval=LEADERBOARD_STREAM_POLL_INTERVAL, queue_size=LEADERBOARD_STREAM_QUEUE_SIZE):
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.loop = None
+        self.lock = None
+        self.poll_task = None
+        # version and local date the rankings were computed for, with the snapshot frame of them
+        self.key = None
+        self.rankings = {}
+        self.snapshot_frame = None
+        self.event_id = 0
+
+    def __bind_loop(self):
+        # asyncio primitives belong to one event loop, start over if called from another one
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self.loop = loop
+            self.lock = asyncio.Lock()
+            self.poll_task = None
+            self.subscribers = set()
+
+    async def subscribe(self)->asyncio.Queue:
+        """
+        Subscribe to the stream, the queue starts with a snapshot frame followed by delta frames
+
+        :return: queue of sse frames
+        :rtype: asyncio.Queue
+        """
+        self.__bind_loop()
+        await self.refresh()
+        queue = asyncio.Queue(self.queue_size)
+        queue.put_nowait(self.snapshot_frame)
+        self.subscribers.add(queue)
+        if self.poll_task is None or self.poll_task.done():
+            self.poll_task = self.loop.create_task(self.__poll())
+        return queue
+
+    def unsubscribe(self, queue:asyncio.Queue)->None:
+        self.subscribers.discard(queue)
+
+    async def refresh(self)->bool:
+        """
+        Rank the members again if the leaderboard version or the local date changed, and broadcast the delta
+
+        :return: True if the rankings changed
+        :rtype: bool
+        """
+        async with self.lock:
+            key = (await sync_to_async(get_leaderboard_version)(), timezone.localdate())
+            if key == self.key:
+                return False
+            key, rankings = await sync_to_async(_ranked_state)()
+            delta = diff_leaderboards(self.rankings, rankings)
+            first = self.key is None
+            self.key, self.rankings = key, rankings
+            self.event_id += 1
+            self.snapshot_frame = _sse_frame('snapshot', self.event_id, {
+                name: sorted(entries.values(), key=lambda entry: entry['rank']) for name, entries in rankings.items()
+            })
+            if first or not delta:
+                return False
+            self.broadcast(_sse_frame('delta', self.event_id, delta))
+            return True
+
+    def broadcast(self, frame:bytes)->None:
+        for queue in self.subscribers:
+            try:
+                queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                # the client missed deltas, replace its backlog by the current snapshot
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(self.snapshot_frame)
+        logger.info(f"Broadcast leaderboard delta {self.event_id} to {len(self.subscribers)} clients")
+
+    async def __poll(self):
+        while self.subscribers:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Failed to refresh the leaderboard stream")
+
+# hub of this process
+leaderboard_hub = LeaderboardHub()
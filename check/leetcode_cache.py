@@ -0,0 +1,164 @@
+"""
+This file is used to cache the responses of the leetcode GraphQL api
+
+Helper modules only, do not do and server operations
+"""
+
+from collections import OrderedDict
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# seconds to keep the response of each operation, operations not listed here are never cached
+DEFAULT_OPERATION_TTLS = {
+    'userPublicProfile': 6 * 3600,
+    'languageStats': 6 * 3600,
+    'skillStats': 6 * 3600,
+    'userBadges': 6 * 3600,
+    'userContestRankingInfo': 3600,
+    'userProfileCalendar': 3600,
+    'userProblemsSolved': 600,
+    'recentAcSubmissions': 60,
+    'recentAcSubmissionsBatch': 60,
+}
+
+class ResponseCache:
+    """
+    TTL + LRU cache of GraphQL responses keyed by (endpoint, operation, variables)
+
+    entries live in memory, bounded by max_entries, and optionally in a sqlite file shared across worker restarts,
+    each process opens its own connection to the file on first use, connections are never shared across fork
+    """
+
+    def __init__(self, operation_ttls=None, max_entries=1024, disk_path=None):
+        """
+        Initialize the ResponseCache
+
+        :param operation_ttls: seconds to keep the response of each operation
+        :type operation_ttls: dict[str, float] or None
+        :param max_entries: max number of entries kept in memory
+        :type max_entries: int
+        :param disk_path: path of the sqlite file backing the cache, memory only if not given
+        :type disk_path: str or None
+        """
+        self.operation_ttls = DEFAULT_OPERATION_TTLS if operation_ttls is None else operation_ttls
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.counters = {'hits': 0, 'misses': 0, 'disk_hits': 0, 'evictions': 0}
+        self._lock = threading.Lock()
+        self.disk_path = disk_path or None
+        # connection to the sqlite file and the pid of the process that opened it
+        self._disk = None
+        self._disk_pid = None
+
+    def _get_disk(self):
+        """
+        Get the sqlite connection of this process, open it if not opened yet or opened before a fork
+
+        :return: connection, None if the cache is memory only
+        :rtype: sqlite3.Connection or None
+        """
+        if self.disk_path is None:
+            return None
+        if self._disk_pid != os.getpid():
+            # the connection of the parent process is left alone, closing it here would affect the parent
+            self._disk = sqlite3.connect(self.disk_path, timeout=5.0, check_same_thread=False)
+            self._disk.execute('PRAGMA journal_mode=WAL')
+            self._disk.execute('CREATE TABLE IF NOT EXISTS response_cache (key TEXT PRIMARY KEY, expires REAL, value TEXT)')
+            self._disk.commit()
+            self._disk_pid = os.getpid()
+        return self._disk
+
+    def is_cached_operation(self, operation):
+        return self.operation_ttls.get(operation, 0) > 0
+
+    @staticmethod
+    def _key(endpoint, operation, variables):
+        return json.dumps([endpoint, operation, variables], sort_keys=True)
+
+    def get(self, endpoint, operation, variables):
+        """
+        Get the cached response, None if missing or expired
+
+        :param endpoint: GraphQL endpoint the response came from, so regions and test servers never share entries
+        :type endpoint: str
+
+        :rtype: dict or None
+        """
+        key = self._key(endpoint, operation, variables)
+        now = time.time()
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > now:
+                self.entries.move_to_end(key)
+                self.counters['hits'] += 1
+                return entry[1]
+            if entry is not None:
+                del self.entries[key]
+            row = None
+            try:
+                disk = self._get_disk()
+                if disk is not None:
+                    row = disk.execute('SELECT expires, value FROM response_cache WHERE key = ?', (key,)).fetchone()
+            except sqlite3.Error as e:
+                logger.error(f'Failed to read response cache from disk, operation: {operation}, error: {e}')
+            if row is not None and row[0] > now:
+                value = json.loads(row[1])
+                self._put(key, row[0], value)
+                self.counters['hits'] += 1
+                self.counters['disk_hits'] += 1
+                return value
+            self.counters['misses'] += 1
+            return None
+
+    def set(self, endpoint, operation, variables, value):
+        """
+        Cache the response for the ttl of the operation, ignored if the operation is not cached
+
+        :param endpoint: GraphQL endpoint the response came from
+        :type endpoint: str
+        """
+        ttl = self.operation_ttls.get(operation, 0)
+        if ttl <= 0:
+            return
+        key = self._key(endpoint, operation, variables)
+        expires = time.time() + ttl
+        with self._lock:
+            self._put(key, expires, value)
+            try:
+                disk = self._get_disk()
+                if disk is not None:
+                    disk.execute('INSERT OR REPLACE INTO response_cache (key, expires, value) VALUES (?, ?, ?)', (key, expires, json.dumps(value)))
+                    disk.execute('DELETE FROM response_cache WHERE expires <= ?', (time.time(),))
+                    disk.commit()
+            except sqlite3.Error as e:
+                logger.error(f'Failed to write response cache to disk, operation: {operation}, error: {e}')
+
+    def _put(self, key, expires, value):
+        self.entries[key] = (expires, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.counters['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            disk = self._get_disk()
+            if disk is not None:
+                disk.execute('DELETE FROM response_cache')
+                disk.commit()
+
+    def get_stats(self):
+        """
+        :return: counters of the cache with the number of entries in memory
+        :rtype: dict
+        """
+        with self._lock:
+            return {**self.counters, 'entries': len(self.entries)}
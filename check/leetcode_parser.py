@@ -2,25 +2,36 @@
 This file is used to parse the user submissions and update the problem data
 """
 
+import asyncio
+from collections import OrderedDict
 import csv
-from datetime import datetime
+from datetime import datetime, timezone
+import hashlib
+import json
 import os
 from pathlib import Path
+import threading
+import time
+from django.core.cache import cache
 from django.template.defaultfilters import slugify
+from django.db import router, transaction
 from django.db.models import Q
-from django.contrib.auth.models import User
-from check.models import Problem, ProblemStatusChoices, Schedule, ScheduleTypeChoices
+from check.models import Problem, ProblemCatalog, ProblemDifficultyChoices, ProblemStatusChoices, Schedule, ScheduleTypeChoices
 
 # typing
 from typing import Optional
 
 # import member models
-from member.models import Member
+from member.models import ServerOperationChoices, ServerOperations
 
 # import leetcode api
-from .leetcode_scraper import LeetcodeScraper
+from .leetcode_scraper import AsyncLeetcodeScraper, LeetcodeScraper
+from .catalog_snapshot import CatalogSnapshot, write_catalog_snapshot
+from .leaderboard import bump_leaderboard_version, record_ac_problems
 LEETCODE_SCRAPER_US=LeetcodeScraper('US')
 LEETCODE_SCRAPER_CN=LeetcodeScraper('CN')
+ASYNC_LEETCODE_SCRAPER_US=AsyncLeetcodeScraper('US', scraper=LEETCODE_SCRAPER_US)
+ASYNC_LEETCODE_SCRAPER_CN=AsyncLeetcodeScraper('CN', scraper=LEETCODE_SCRAPER_CN)
 
 # import logging
 import logging
@@ -28,181 +39,540 @@ logger = logging.getLogger(__name__)
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-def __update_root_problem_list()->Optional[Schedule]:
+# process-wide index of the problem catalog by code, title and slug, loaded on first lookup
+_problem_catalog_index = None
+# reentrant, loading an empty catalog fills it from the csv, which invalidates the index
+_problem_catalog_index_lock = threading.RLock()
+# snapshot written by the build_catalog_snapshot command, mapped by the first load of the index in each process,
+# kept under var/ with the other generated files, out of version control
+PROBLEM_CATALOG_SNAPSHOT_PATH = os.getenv('PROBLEM_CATALOG_SNAPSHOT_PATH') or os.path.join(BASE_DIR, 'var', 'problem_catalog.snapshot')
+# once the index is invalidated the snapshot is older than the database, later loads read the database
+_problem_catalog_snapshot_stale = False
+
+# seconds a title or code missing from the problem catalog is remembered, before a reload may be tried for it again
+PROBLEM_CATALOG_MISS_TTL = 3600
+# max titles and codes remembered as missing, the least recently missed ones are forgotten first
+PROBLEM_CATALOG_MISS_MAX_ENTRIES = 1024
+# min seconds between two reloads of the problem catalog, across all workers sharing the django cache
+PROBLEM_CATALOG_RELOAD_INTERVAL = 600
+PROBLEM_CATALOG_RELOAD_CACHE_KEY = 'check:problem_catalog_reload'
+# (kind, key) -> time until which the lookup is known to miss, in least recently missed first order
+_problem_catalog_misses = OrderedDict()
+_problem_catalog_misses_lock = threading.Lock()
+_problem_catalog_reload_lock = threading.Lock()
+_problem_catalog_stats_lock = threading.Lock()
+problem_catalog_stats = {'misses': 0, 'negative_hits': 0, 'negative_evictions': 0, 'reloads': 0, 'reloads_skipped': 0}
+
+def __parse_acceptance_rate(acceptance_rate:str)->Optional[float]:
+    # e.g. 54.0%
+    try:
+        return float(acceptance_rate.rstrip('%'))
+    except ValueError:
+        return None
+
+def __update_problem_catalog()->None:
     """
-    Update the root problem list from csv file
+    Update the problem catalog from csv file, used to fill an empty catalog without network
 
-    takes 1 minute to update, do not call this function frequently
+    diff the csv against the catalog by code, create the new problems and update the changed ones in bulk,
+    all in one transaction, rows already synced from leetcode are kept
     """
-    # create root schedule
-    logger.info("Updating root schedule...")
-    root_schedule = __get_root_schedule()
+    logger.info("Updating problem catalog...")
     # read csv file from static/leetcode_problem.csv
+    csv_problems = {}
     with open(os.path.join(BASE_DIR, 'static/leetcode_problem.csv'), 'r') as file:
         reader = csv.reader(file)
-        root_problem_list = [problem.problem_code for problem in Problem.objects.filter(schedule_id=root_schedule)]
-        # logger.info(f"Root problem list: {root_problem_list}")
-        # skip the first row (header)
         for row in reader:
             try:
                 problem_code = int(row[0])
             except ValueError:
                 logger.error(f"Problem code {row[0]} is not a valid integer, skip this problem")
                 continue
-            problem_name = row[1]
-            # problem_difficulty = row[2]
-            # problem_acceptance_rate = row[3]
-            # create a new problem if not exists
-            if problem_code not in root_problem_list:
-                logger.info(f"Creating problem {problem_code} {problem_name}...")
-                Problem.objects.create(
-                    schedule_id=root_schedule,
+            # titles with a comma are not quoted, and some rows swap difficulty and acceptance rate
+            problem_name = ','.join(row[1:-2])
+            difficulty = next((value for value in row[-2:] if value in ProblemDifficultyChoices.values), None)
+            acceptance_rate = next((__parse_acceptance_rate(value) for value in row[-2:] if value.endswith('%')), None)
+            csv_problems[problem_code] = (problem_name, difficulty, acceptance_rate)
+    with transaction.atomic():
+        catalog_problems = ProblemCatalog.objects.in_bulk()
+        new_problems = []
+        changed_problems = []
+        for problem_code, (problem_name, difficulty, acceptance_rate) in csv_problems.items():
+            problem = catalog_problems.get(problem_code)
+            if problem is None:
+                new_problems.append(ProblemCatalog(
                     problem_code=problem_code,
                     problem_title=problem_name,
                     # guess the problem slug, not accurate
                     problem_slug=slugify(problem_name),
-                    status=ProblemStatusChoices.SP,
-                    proof_url=None,
-                )
-    return root_schedule
+                    difficulty=difficulty,
+                    acceptance_rate=acceptance_rate,
+                ))
+                continue
+            # rows synced from leetcode are newer than the csv
+            if problem.content_hash is not None:
+                continue
+            if (problem.problem_title, problem.difficulty, problem.acceptance_rate) == (problem_name, difficulty, acceptance_rate):
+                continue
+            # keep slugs corrected by submissions, only guess again the ones guessed from the old title
+            if problem.problem_slug == slugify(problem.problem_title):
+                problem.problem_slug = slugify(problem_name)
+            problem.problem_title = problem_name
+            problem.difficulty = difficulty
+            problem.acceptance_rate = acceptance_rate
+            changed_problems.append(problem)
+        ProblemCatalog.objects.bulk_create(new_problems, batch_size=1000)
+        ProblemCatalog.objects.bulk_update(changed_problems, ['problem_title', 'problem_slug', 'difficulty', 'acceptance_rate'], batch_size=1000)
+    logger.info(f"Created {len(new_problems)} and updated {len(changed_problems)} catalog problems")
+    invalidate_problem_catalog_index()
+
+def __problem_content_hash(problem_title:str, problem_slug:str, difficulty:Optional[str], acceptance_rate:Optional[float])->str:
+    return hashlib.sha1(json.dumps([problem_title, problem_slug, difficulty, acceptance_rate]).encode('utf8')).hexdigest()
+
+def sync_problem_catalog(scraper:Optional[LeetcodeScraper]=None, page_size:int=100)->dict:
+    """
+    Sync the problem catalog with the problem set listing of leetcode
 
+    each listed problem is hashed and compared with the stored content hash, only new and changed problems
+    are upserted, page by page
 
-def __get_root_schedule()->Optional[Schedule]:
+    :param scraper: scraper to list the problems with, LEETCODE_SCRAPER_US if not given
+    :type scraper: LeetcodeScraper or None
+    :param page_size: number of problems per request
+    :type page_size: int
+
+    :return: number of problems listed, created and updated, and whether the listing completed
+    :rtype: dict
+    """
+    scraper = scraper or LEETCODE_SCRAPER_US
+    logger.info("Syncing problem catalog from leetcode...")
+    stored_hashes = dict(ProblemCatalog.objects.values_list('problem_code', 'content_hash'))
+    result = {'listed': 0, 'created': 0, 'updated': 0, 'complete': False}
+    total = None
+    for total, questions in scraper.iter_problemset_pages(page_size):
+        changed_problems = []
+        for question in questions:
+            result['listed'] += 1
+            try:
+                problem_code = int(question['frontendQuestionId'])
+            except (TypeError, ValueError):
+                logger.warning(f"Problem code {question.get('frontendQuestionId')} is not a valid integer, skip this problem")
+                continue
+            # keep the precision of the csv, the rate moves on every submission
+            acceptance_rate = round(question['acRate'], 1) if question.get('acRate') is not None else None
+            difficulty = question.get('difficulty') if question.get('difficulty') in ProblemDifficultyChoices.values else None
+            content_hash = __problem_content_hash(question['title'], question['titleSlug'], difficulty, acceptance_rate)
+            if stored_hashes.get(problem_code) == content_hash:
+                continue
+            result['updated' if problem_code in stored_hashes else 'created'] += 1
+            stored_hashes[problem_code] = content_hash
+            changed_problems.append(ProblemCatalog(
+                problem_code=problem_code,
+                problem_title=question['title'],
+                problem_slug=question['titleSlug'],
+                difficulty=difficulty,
+                acceptance_rate=acceptance_rate,
+                content_hash=content_hash,
+            ))
+        if changed_problems:
+            ProblemCatalog.objects.bulk_create(
+                changed_problems,
+                update_conflicts=True,
+                unique_fields=['problem_code'],
+                update_fields=['problem_title', 'problem_slug', 'difficulty', 'acceptance_rate', 'content_hash'],
+            )
+    result['complete'] = total is not None and result['listed'] >= total
+    if result['created'] or result['updated']:
+        invalidate_problem_catalog_index()
+    message = f"Synced problem catalog: {result['listed']} listed, {result['created']} created, {result['updated']} updated"
+    logger.info(message)
+    ServerOperations.objects.create(operation_name=ServerOperationChoices.UPDATE_PROBLEM, message=message if result['complete'] else f"{message}, listing incomplete")
+    return result
+
+def __load_problem_catalog_snapshot()->Optional[dict]:
     """
-    Get the root schedule, if not exists, create one
+    Map the problem catalog snapshot into an index, rows are turned into catalog problems on first lookup
 
-    :return: root schedule
-    :rtype: Schedule
+    :return: index backed by the snapshot, None if there is no usable snapshot
+    :rtype: dict or None
     """
-    # check if root schedule exists
-    root_schedule = Schedule.objects.filter(schedule_type=ScheduleTypeChoices.ROOT).first()
-    if root_schedule is None:
-        root_schedule = Schedule.objects.create(
-            schedule_type=ScheduleTypeChoices.ROOT,
-            member_id=Member.objects.get(user_id=User.objects.get(username='root')),
-            goals=65535,
-        )
-        __update_root_problem_list()
-    return root_schedule
+    if _problem_catalog_snapshot_stale or not os.path.exists(PROBLEM_CATALOG_SNAPSHOT_PATH):
+        return None
+    try:
+        snapshot = CatalogSnapshot(PROBLEM_CATALOG_SNAPSHOT_PATH)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Problem catalog snapshot not usable, loading from the database: {e}")
+        return None
+    logger.info(f"Mapped {len(snapshot)} catalog problems from the snapshot {PROBLEM_CATALOG_SNAPSHOT_PATH}")
+    # misses reload the catalog if another worker synced it after the snapshot was written
+    return {'code': {}, 'title': {}, 'slug': {}, 'loaded_at': snapshot.built_at, 'snapshot': snapshot}
 
-def get_root_problem_by_code(problem_code:int)->Optional[Problem]:
+def __get_problem_catalog_index()->dict:
     """
-    Get the problem data, if not exists, update the problem data
+    Get the index of the problem catalog, map the snapshot or load it from the database if not loaded
 
-    :param problem_code: problem code
-    :type problem_code: int
+    :return: catalog problems keyed by code, title and slug
+    :rtype: dict[str, dict]
+    """
+    global _problem_catalog_index
+    with _problem_catalog_index_lock:
+        if _problem_catalog_index is None:
+            index = __load_problem_catalog_snapshot()
+            if index is not None:
+                _problem_catalog_index = index
+                return _problem_catalog_index
+            problems = list(ProblemCatalog.objects.all())
+            if not problems:
+                __update_problem_catalog()
+                problems = list(ProblemCatalog.objects.all())
+            index = {'code': {}, 'title': {}, 'slug': {}, 'loaded_at': time.time(), 'snapshot': None}
+            for problem in problems:
+                index['code'][problem.problem_code] = problem
+                index['title'].setdefault(problem.problem_title, problem)
+                index['slug'].setdefault(problem.problem_slug, problem)
+            logger.info(f"Loaded {len(index['code'])} catalog problems into the index")
+            _problem_catalog_index = index
+        return _problem_catalog_index
 
-    :return: problem data
-    :rtype: Problem or None
+def __lookup_problem_catalog_index(kind:str, key)->Optional[ProblemCatalog]:
     """
-    # get the problem
-    root_schedule = __get_root_schedule()
-    problem = Problem.objects.filter(schedule_id=root_schedule, problem_code=problem_code).first()
+    Look a catalog problem up in the index, without reloading anything
+
+    :param kind: index to look up, code, title or slug
+    :type kind: str
+    :param key: problem code, title or slug
+
+    :return: catalog problem
+    :rtype: ProblemCatalog or None
+    """
+    index = __get_problem_catalog_index()
+    problem = index[kind].get(key)
+    if problem is not None or index['snapshot'] is None:
+        return problem
+    snapshot = index['snapshot']
+    row = {'code': snapshot.find_code, 'title': snapshot.find_title, 'slug': snapshot.find_slug}[kind](key)
+    if row is None:
+        return None
+    fields = snapshot.row(row)
+    # one instance per problem, so slug fixes are seen by every index
+    problem = index['code'].get(fields['problem_code'])
+    if problem is None:
+        problem = ProblemCatalog.from_db(router.db_for_read(ProblemCatalog), list(fields), list(fields.values()))
+        problem = index['code'].setdefault(problem.problem_code, problem)
+    return index[kind].setdefault(key, problem)
+
+def invalidate_problem_catalog_index()->None:
+    """
+    Drop the index of the problem catalog, the next lookup reloads it from the database
+
+    call it whenever the problem catalog is refreshed
+    """
+    global _problem_catalog_index, _problem_catalog_snapshot_stale
+    with _problem_catalog_index_lock:
+        _problem_catalog_index = None
+        _problem_catalog_snapshot_stale = True
+    # the refreshed catalog may have the problems that missed
+    with _problem_catalog_misses_lock:
+        _problem_catalog_misses.clear()
+
+def __count_problem_catalog_stat(stat:str)->None:
+    with _problem_catalog_stats_lock:
+        problem_catalog_stats[stat] += 1
+
+def get_problem_catalog_stats()->dict:
+    """
+    Get the counters of catalog lookups that missed the index
+
+    :return: misses, lookups answered by the negative cache, negative entries evicted and held, reloads run and reloads skipped
+    :rtype: dict
+    """
+    with _problem_catalog_stats_lock:
+        stats = dict(problem_catalog_stats)
+    with _problem_catalog_misses_lock:
+        stats['negative_entries'] = len(_problem_catalog_misses)
+    return stats
+
+def __is_known_problem_catalog_miss(kind:str, key, now:float)->bool:
+    with _problem_catalog_misses_lock:
+        expires = _problem_catalog_misses.get((kind, key))
+        if expires is None:
+            return False
+        if expires <= now:
+            del _problem_catalog_misses[(kind, key)]
+            return False
+        _problem_catalog_misses.move_to_end((kind, key))
+        return True
+
+def __remember_problem_catalog_miss(kind:str, key, now:float)->None:
+    evicted = 0
+    with _problem_catalog_misses_lock:
+        _problem_catalog_misses[(kind, key)] = now + PROBLEM_CATALOG_MISS_TTL
+        _problem_catalog_misses.move_to_end((kind, key))
+        while len(_problem_catalog_misses) > PROBLEM_CATALOG_MISS_MAX_ENTRIES:
+            _problem_catalog_misses.popitem(last=False)
+            evicted += 1
+    if evicted:
+        with _problem_catalog_stats_lock:
+            problem_catalog_stats['negative_evictions'] += evicted
+
+def __reload_problem_catalog_once()->None:
+    """
+    Sync the problem catalog from leetcode, unless a reload already ran within PROBLEM_CATALOG_RELOAD_INTERVAL
+
+    only one thread of the process reloads at a time, the others wait for it and reuse its result,
+    the interval is shared with other workers through the django cache
+    """
+    with _problem_catalog_reload_lock:
+        if cache.add(PROBLEM_CATALOG_RELOAD_CACHE_KEY, time.time(), PROBLEM_CATALOG_RELOAD_INTERVAL):
+            sync_problem_catalog()
+            __count_problem_catalog_stat('reloads')
+            # the sync only invalidates the index on changes, reload it anyway to pick up rows of other workers
+            invalidate_problem_catalog_index()
+            return
+        __count_problem_catalog_stat('reloads_skipped')
+        # another worker reloaded after this process loaded its index, pick its rows up
+        reloaded_at = cache.get(PROBLEM_CATALOG_RELOAD_CACHE_KEY)
+        with _problem_catalog_index_lock:
+            if _problem_catalog_index is not None and reloaded_at is not None and reloaded_at > _problem_catalog_index['loaded_at']:
+                invalidate_problem_catalog_index()
+
+def __get_catalog_problem(kind:str, key)->Optional[ProblemCatalog]:
+    """
+    Look a catalog problem up in the index, reload the problem catalog on a miss
+
+    keys that missed recently are answered from the negative cache without reloading
+
+    :param kind: index to look up, code, title or slug
+    :type kind: str
+    :param key: problem code, title or slug
+
+    :return: catalog problem
+    :rtype: ProblemCatalog or None
+    """
+    problem = __lookup_problem_catalog_index(kind, key)
     if problem is not None:
         return problem
-    logger.info(f"Problem with code {problem_code} not found, updating...")
-    __update_root_problem_list()
-    return Problem.objects.filter(schedule_id=root_schedule, problem_code=problem_code).first()
+    now = time.time()
+    if __is_known_problem_catalog_miss(kind, key, now):
+        __count_problem_catalog_stat('negative_hits')
+        return None
+    __count_problem_catalog_stat('misses')
+    logger.info(f"Problem with {kind} {key} not found, updating...")
+    __reload_problem_catalog_once()
+    problem = __lookup_problem_catalog_index(kind, key)
+    if problem is None:
+        logger.warning(f"Problem with {kind} {key} not found after reload, remembered for {PROBLEM_CATALOG_MISS_TTL} seconds")
+        __remember_problem_catalog_miss(kind, key, now)
+    return problem
+
+def get_catalog_problem_by_code(problem_code:int)->Optional[ProblemCatalog]:
+    """
+    Get the catalog problem by problem code, if not exists, update the problem catalog
+
+    :param problem_code: problem code
+    :type problem_code: int
+
+    :return: catalog problem
+    :rtype: ProblemCatalog or None
+    """
+    return __get_catalog_problem('code', problem_code)
 
 
-def get_root_problem_by_title(problem_title:str)->Optional[Problem]:
+def get_catalog_problem_by_title(problem_title:str)->Optional[ProblemCatalog]:
     """
-    Get the root problem by problem title
+    Get the catalog problem by problem title, if not exists, update the problem catalog
 
     :param problem_title: problem title
     :type problem_title: str
 
-    :return: root problem
-    :rtype: Problem or None
+    :return: catalog problem
+    :rtype: ProblemCatalog or None
     """
-    root_schedule = __get_root_schedule()
-    problem = Problem.objects.filter(schedule_id=root_schedule, problem_title=problem_title).first()
-    if problem is not None:
-        return problem
-    logger.info(f"Problem with title {problem_title} not found, updating...")
-    __update_root_problem_list()
-    return Problem.objects.filter(schedule_id=root_schedule, problem_title=problem_title).first()
+    return __get_catalog_problem('title', problem_title)
+
+def get_catalog_problem_by_slug(problem_slug:str)->Optional[ProblemCatalog]:
+    """
+    Get the catalog problem by problem slug, slugs are guessed from titles until a submission corrects them
+
+    :param problem_slug: problem slug
+    :type problem_slug: str
 
-def get_full_problem_list()->Optional[list[Problem]]:
+    :return: catalog problem
+    :rtype: ProblemCatalog or None
     """
-    Get the full problem list from root schedule
+    return __lookup_problem_catalog_index('slug', problem_slug)
+
+def get_full_problem_list():
+    """
+    Get the full problem list from the problem catalog
 
     :return: list of problem
-    :rtype: Problem
+    :rtype: QuerySet[ProblemCatalog]
     """
-    root_schedule = __get_root_schedule()
-    return Problem.objects.filter(schedule_id=root_schedule)
+    return ProblemCatalog.objects.all()
 
-def update_ac_problems(member) -> Optional[list[Problem]]:
+def build_problem_catalog_snapshot(path:Optional[str]=None)->int:
+    """
+    Write the problem catalog into a snapshot, workers started afterwards map it instead of querying the catalog
+
+    :param path: path of the snapshot file, PROBLEM_CATALOG_SNAPSHOT_PATH if not given
+    :type path: str or None
+
+    :return: number of catalog problems written
+    :rtype: int
+    """
+    if not ProblemCatalog.objects.exists():
+        __update_problem_catalog()
+    problems = ProblemCatalog.objects.values('problem_code', 'problem_title', 'problem_slug', 'difficulty', 'acceptance_rate')
+    path = path or PROBLEM_CATALOG_SNAPSHOT_PATH
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    return write_catalog_snapshot(problems.iterator(), path)
+
+async def scrape_members_recent_submissions_async(members) -> dict:
+    """
+    Scrape the recent ac submissions of members in batches, all regions and batches concurrently
+
+    :param members: members to scrape
+    :type members: list[Member]
+
+    :return: (server region, leetcode username) to scraped recent ac submissions
+    :rtype: dict
+    """
+    server_regions = ('US', 'CN')
+    scrapers = (ASYNC_LEETCODE_SCRAPER_US, ASYNC_LEETCODE_SCRAPER_CN)
+    results = await asyncio.gather(*(
+        scraper.scrape_users_recent_submissions([member.leetcode_username for member in members if member.server_region == server_region])
+        for scraper, server_region in zip(scrapers, server_regions)
+    ))
+    output = {}
+    for server_region, result in zip(server_regions, results):
+        for username, ac_problems in result.items():
+            output[(server_region, username)] = ac_problems
+    return output
+
+def scrape_members_recent_submissions(members) -> dict:
+    """
+    Blocking driver of scrape_members_recent_submissions_async, do not call inside a running event loop
+
+    :param members: members to scrape
+    :type members: list[Member]
+
+    :return: (server region, leetcode username) to scraped recent ac submissions
+    :rtype: dict
+    """
+    return asyncio.run(scrape_members_recent_submissions_async(members))
+
+def update_ac_problems(member, ac_problems: Optional[dict] = None) -> Optional[list[Problem]]:
     """ 
     Get the AC problems of a user
 
     :param member: member
     :type member: Member
+    :param ac_problems: recent ac submissions already scraped in batch, scrape the member if not given
+    :type ac_problems: dict or None
 
     :return: list of ac problems
     :rtype: list[Problem]
     """
-    scraper = LEETCODE_SCRAPER_US if member.server_region == 'US' else LEETCODE_SCRAPER_CN
-    ac_problems = scraper.scrape_user_recent_submissions(member.leetcode_username)
+    if ac_problems is None:
+        scraper = LEETCODE_SCRAPER_US if member.server_region == 'US' else LEETCODE_SCRAPER_CN
+        ac_problems = scraper.scrape_user_recent_submissions(member.leetcode_username)
     # get recent ac submissions
     try:
         submissions = ac_problems['recentAcSubmissions']['recentAcSubmissionList']
     except KeyError:
         logger.error(f"No recent ac submissions found for user {member.leetcode_username}, check the leetcode api, {ac_problems}")
         return []
-    for submission in submissions:
-        proof_url = f"https://leetcode.com/submissions/detail/{submission['id']}/"
+    # only submissions newer than the watermark of the member need to be processed
+    new_submissions = [
+        submission for submission in submissions or []
+        if member.last_submission_id is None or int(submission['id']) > member.last_submission_id
+    ]
+    if not new_submissions:
+        logger.info(f"No new ac submissions for user {member.leetcode_username}")
+        return ac_problems
+    # prefetch everything the submissions are matched against
+    proof_urls = [f"https://leetcode.com/submissions/detail/{submission['id']}/" for submission in new_submissions]
+    known_proof_urls = set(Problem.objects.filter(proof_url__in=proof_urls).values_list('proof_url', flat=True))
+    # open problems of the member in normal schedules by catalog problem, oldest first
+    open_problems = {}
+    for problem in Problem.objects.filter(
+        Q(schedule_id__member_id=member) & 
+        Q(status=ProblemStatusChoices.NA) &
+        Q(schedule_id__schedule_type=ScheduleTypeChoices.NORMAL)
+    ).order_by('id'):
+        open_problems.setdefault(problem.catalog_id_id, []).append(problem)
+    # latest free schedule of the member
+    free_schedule = Schedule.objects.filter(Q(member_id=member) & Q(schedule_type=ScheduleTypeChoices.FREE)).order_by('-start_date').first()
+
+    renamed_catalog_problems = []
+    satisfied_problems = []
+    free_problems = []
+    # submissions whose problem is not in the catalog yet, retried on the next update
+    unresolved_submission_ids = []
+    for proof_url, submission in zip(proof_urls, new_submissions):
         problem_title = submission['title']
         problem_slug = submission['titleSlug']
-        timestamp = submission['timestamp']
+        done_date = datetime.fromtimestamp(int(submission['timestamp']), tz=timezone.utc)
         # check if problem is already registered
-        if Problem.objects.filter(proof_url=proof_url).exists():
+        if proof_url in known_proof_urls:
             logger.info(f"Problem {problem_title} already registered, ignore this problem")
             continue
+        known_proof_urls.add(proof_url)
         
-        # get root problem, if not found, ignore this problem
-        root_problem = get_root_problem_by_title(problem_title)
-        if root_problem is None:
-            logger.error(f"Root problem {problem_title} not found, ignore this problem")
+        # get catalog problem, if not found, ignore this problem
+        catalog_problem = get_catalog_problem_by_title(problem_title)
+        if catalog_problem is None:
+            logger.error(f"Catalog problem {problem_title} not found, retry this problem on the next update")
+            unresolved_submission_ids.append(int(submission['id']))
             continue
-        # update slug dynamically if root problem is incorrect
-        if root_problem.problem_slug != problem_slug:
-            for matched_problem in Problem.objects.filter(problem_title=problem_title):
-                if matched_problem.problem_slug != problem_slug:
-                    matched_problem.problem_slug = problem_slug
-                    matched_problem.save()
-                break
+        # update slug dynamically if catalog problem is incorrect, the indexed catalog problem is updated in place
+        if catalog_problem.problem_slug != problem_slug:
+            catalog_problem.problem_slug = problem_slug
+            renamed_catalog_problems.append(catalog_problem)
 
         # check satisfied problem for normal schedule
-        satisfied_problem = Problem.objects.filter(
-            Q(problem_title=problem_title) & 
-            Q(schedule_id__member_id=member) & 
-            Q(status=ProblemStatusChoices.NA) &
-            Q(schedule_id__schedule_type=ScheduleTypeChoices.NORMAL)
-        ).first()
-        if satisfied_problem is not None:
+        if open_problems.get(catalog_problem.problem_code):
+            satisfied_problem = open_problems[catalog_problem.problem_code].pop(0)
             logger.info(f"Find satisfied problem {problem_title} for member {member.user_id.username}, mark as AC")
             satisfied_problem.status = ProblemStatusChoices.AC
             satisfied_problem.proof_url = proof_url
-            satisfied_problem.done_date = datetime.fromtimestamp(int(timestamp))
-            satisfied_problem.save()
+            satisfied_problem.done_date = done_date
+            satisfied_problems.append(satisfied_problem)
             continue
         # add to latest free schedule set
-        free_schedule = Schedule.objects.filter(Q(schedule_type=ScheduleTypeChoices.FREE)).order_by('-start_date').first()
-        logger.info(f"Add recent ac problem {root_problem.problem_title} to free schedule: {free_schedule}")
-        # create a free problem
-        Problem.objects.create(
+        free_problems.append(Problem(
             schedule_id=free_schedule,
-            problem_code=root_problem.problem_code,
-            problem_title=root_problem.problem_title,
-            problem_slug=root_problem.problem_slug,
+            catalog_id=catalog_problem,
             status=ProblemStatusChoices.AC,
             proof_url=proof_url,
-            done_date=datetime.fromtimestamp(int(timestamp)),
-        )
+            done_date=done_date,
+        ))
         # TODO: add credit to member
-    return ac_problems
-
-
 
+    with transaction.atomic():
+        ProblemCatalog.objects.bulk_update(renamed_catalog_problems, ['problem_slug'])
+        Problem.objects.bulk_update(satisfied_problems, ['status', 'proof_url', 'done_date'])
+        if free_problems:
+            if free_schedule is None:
+                # members registered from the sheet always have one, create it for the others
+                free_schedule = Schedule.objects.create(member_id=member, schedule_type=ScheduleTypeChoices.FREE, goals=65535, expire_date=None)
+                for problem in free_problems:
+                    problem.schedule_id = free_schedule
+            logger.info(f"Add {len(free_problems)} recent ac problems to free schedule: {free_schedule}")
+            Problem.objects.bulk_create(free_problems)
+        record_ac_problems(member, [problem.done_date for problem in satisfied_problems + free_problems])
+        if satisfied_problems or free_problems:
+            # cached benchmark pages are dropped once the problems are visible to other connections
+            transaction.on_commit(bump_leaderboard_version)
+        # advance the watermark to the newest submission processed, but never past an unresolved one
+        processed_submissions = [
+            submission for submission in new_submissions
+            if not unresolved_submission_ids or int(submission['id']) < min(unresolved_submission_ids)
+        ]
+        if processed_submissions:
+            newest_submission = max(processed_submissions, key=lambda submission: int(submission['id']))
+            member.last_submission_id = int(newest_submission['id'])
+            member.last_submission_timestamp = datetime.fromtimestamp(int(newest_submission['timestamp']), tz=timezone.utc)
+            member.save(update_fields=['last_submission_id', 'last_submission_timestamp'])
+    return ac_problems
@@ -1,27 +1,287 @@
-from concurrent.futures import ThreadPoolExecutor
+import asyncio
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import json
+import os
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
 from warnings import filterwarnings
 import logging
 
+from .leetcode_cache import ResponseCache
+
 logger = logging.getLogger(__name__)
 
 filterwarnings('ignore')
 
+class RateLimiter:
+    """
+    Token bucket with AIMD concurrency control for one server region
+
+    every request takes a token (refilled at rate per second, up to burst) and an in-flight slot,
+    the number of slots grows by about one per round of successes and halves on 429/5xx or network errors
+    """
+
+    def __init__(self, rate, burst, max_concurrency, min_concurrency=1):
+        """
+        Initialize the RateLimiter
+
+        :param rate: tokens refilled per second
+        :type rate: float
+        :param burst: max number of tokens in the bucket
+        :type burst: int
+        :param max_concurrency: upper bound of requests in flight
+        :type max_concurrency: int
+        :param min_concurrency: lower bound of requests in flight after backing off
+        :type min_concurrency: int
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.concurrency_limit = float(min(max_concurrency, max(min_concurrency, max_concurrency // 4)))
+        self.in_flight = 0
+        self.tokens = float(burst)
+        self.last_refill = time.monotonic()
+        self.counters = {'requests': 0, 'throttled': 0, 'retried': 0, 'failed': 0, 'backoffs': 0}
+        self._condition = threading.Condition()
+        self._bucket_lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Block until an in-flight slot and a token are available
+        """
+        with self._condition:
+            while self.in_flight >= int(self.concurrency_limit):
+                self._condition.wait()
+            self.in_flight += 1
+            self.counters['requests'] += 1
+        throttled = False
+        while True:
+            with self._bucket_lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+                self.last_refill = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_time = (1 - self.tokens) / self.rate
+            if not throttled:
+                throttled = True
+                self.count('throttled')
+            time.sleep(wait_time)
+
+    def release(self, success):
+        """
+        Free the in-flight slot, increase the concurrency additively on success and halve it on failure
+
+        :param success: whether the request was accepted by the server
+        :type success: bool
+        """
+        with self._condition:
+            self.in_flight -= 1
+            if success:
+                self.concurrency_limit = min(self.max_concurrency, self.concurrency_limit + 1 / self.concurrency_limit)
+            else:
+                self.concurrency_limit = max(self.min_concurrency, self.concurrency_limit / 2)
+                self.counters['backoffs'] += 1
+            self._condition.notify_all()
+
+    def count(self, counter):
+        with self._condition:
+            self.counters[counter] += 1
+
+    def get_stats(self):
+        """
+        :return: counters of the limiter with the current concurrency limit
+        :rtype: dict
+        """
+        with self._condition:
+            return {**self.counters, 'concurrency_limit': int(self.concurrency_limit), 'in_flight': self.in_flight}
+
+# shared by all scrapers of a region, leetcode.cn tolerates a lower request rate than leetcode.com
+RATE_LIMITERS = {
+    'US': RateLimiter(rate=10, burst=20, max_concurrency=32),
+    'CN': RateLimiter(rate=5, burst=10, max_concurrency=16),
+}
+
+# shared response cache, set LEETCODE_CACHE_PATH to keep the cache on disk across worker restarts
+RESPONSE_CACHE = ResponseCache(disk_path=os.getenv('LEETCODE_CACHE_PATH'))
+
+class JsonlRankingSink:
+    """
+    Append global ranking pages to a jsonl file, one ranking node per line
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'a', encoding='utf8')
+
+    def write_page(self, page_num, ranking_nodes):
+        for node in ranking_nodes:
+            self.file.write(json.dumps({'page': page_num, **node}, ensure_ascii=False) + '\n')
+        # flush before the page is checkpointed, so a restart never skips unwritten pages
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class RankingCrawlCheckpoint:
+    """
+    Append-only record of the global ranking pages already written to the sink
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.completed_pages = set()
+        if os.path.exists(path):
+            with open(path, 'r') as file:
+                self.completed_pages = {int(line) for line in file if line.strip()}
+        self.file = open(path, 'a')
+
+    def mark(self, page_num):
+        self.completed_pages.add(page_num)
+        self.file.write(f'{page_num}\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
 class LeetcodeScraper:
 
-    def __init__(self,server_region):
+    # shared connection pools, one per server region, reused by every scraper of that region
+    _sessions = {}
+    _sessions_lock = threading.Lock()
+
+    def __init__(self,server_region, pool_size=32, keep_alive=True, connect_timeout=5.0, read_timeout=30.0, max_retries=3, backoff_factor=0.5, cache=RESPONSE_CACHE, rate_limiter=None, base_url=None):
         """
         Initialize the LeetcodeScraper
         
         :param server_region: The server region to scrape the data from (US or CN)
         :type server_region: str
+        :param pool_size: max number of kept-alive connections in the region pool
+        :type pool_size: int
+        :param keep_alive: whether to reuse connections between requests
+        :type keep_alive: bool
+        :param connect_timeout: seconds to wait for the TCP/TLS connection
+        :type connect_timeout: float
+        :param read_timeout: seconds to wait for the response body
+        :type read_timeout: float
+        :param max_retries: number of retries on 429/5xx or network errors
+        :type max_retries: int
+        :param backoff_factor: base seconds of the exponential backoff between retries
+        :type backoff_factor: float
+        :param cache: cache of the responses of named operations, None to disable caching
+        :type cache: ResponseCache or None
+        :param rate_limiter: rate limiter of the requests, the shared limiter of the region if not given
+        :type rate_limiter: RateLimiter or None
+        :param base_url: GraphQL endpoint, the leetcode site of the region if not given
+        :type base_url: str or None
 
         :raises ValueError: If the server region is not US or CN
         """
         if server_region not in ['US', 'CN']:
             raise ValueError(f'Invalid server region: {server_region}')
-        base_url='https://leetcode.com/graphql' if server_region == 'US' else 'https://leetcode.cn/graphql'
+        if base_url is None:
+            base_url='https://leetcode.com/graphql' if server_region == 'US' else 'https://leetcode.cn/graphql'
         self.base_url = base_url
+        self.server_region = server_region
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = self._get_session(server_region, pool_size, keep_alive)
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RATE_LIMITERS[server_region]
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.cache = cache
+
+    @classmethod
+    def _get_session(cls, server_region, pool_size, keep_alive):
+        """
+        Get the shared session of the server region, create one if not exists
+
+        the first scraper of a region decides the pool configuration, later scrapers reuse it
+
+        :return: session holding the connection pool of the region
+        :rtype: requests.Session
+        """
+        with cls._sessions_lock:
+            session = cls._sessions.get(server_region)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers.update({
+                    'Accept-Encoding': 'gzip, deflate',
+                    'Connection': 'keep-alive' if keep_alive else 'close',
+                    'Content-Type': 'application/json',
+                })
+                session.verify = False
+                cls._sessions[server_region] = session
+            return session
+
+    def _post(self, json_data):
+        """
+        Post a GraphQL document, answering from the response cache when the operation is cached
+
+        :param json_data: GraphQL request body
+        :type json_data: dict
+
+        :return: decoded json response
+        :rtype: dict
+        """
+        operation = json_data.get('operationName')
+        if self.cache is None or not self.cache.is_cached_operation(operation):
+            return self._send(json_data)
+        variables = json_data.get('variables')
+        response = self.cache.get(self.base_url, operation, variables)
+        if response is None:
+            response = self._send(json_data)
+            # never cache partial failures
+            if response.get('data') is not None and not response.get('errors'):
+                self.cache.set(self.base_url, operation, variables, response)
+        return response
+
+    def _send(self, json_data):
+        """
+        Post a GraphQL document through the pooled session of this region
+
+        requests are throttled by the rate limiter of the region, 429/5xx responses and network errors
+        are retried with exponential backoff (or the Retry-After header if given)
+
+        :param json_data: GraphQL request body
+        :type json_data: dict
+
+        :return: decoded json response
+        :rtype: dict
+
+        :raises requests.RequestException: If the request still fails after all retries
+        """
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            retry_after = None
+            try:
+                response = self.session.post(self.base_url, json=json_data, timeout=self.timeout)
+            except requests.RequestException:
+                self.rate_limiter.release(success=False)
+                if attempt == self.max_retries:
+                    self.rate_limiter.count('failed')
+                    raise
+            else:
+                if response.status_code != 429 and response.status_code < 500:
+                    self.rate_limiter.release(success=True)
+                    return response.json()
+                self.rate_limiter.release(success=False)
+                if attempt == self.max_retries:
+                    self.rate_limiter.count('failed')
+                    response.raise_for_status()
+                retry_after = response.headers.get('Retry-After')
+            self.rate_limiter.count('retried')
+            try:
+                delay = float(retry_after)
+            except (TypeError, ValueError):
+                delay = self.backoff_factor * 2 ** attempt
+            time.sleep(delay)
 
     def scrape_user_recent_submissions(self,username):
         output = {}
@@ -39,19 +299,73 @@ class LeetcodeScraper:
                 json_data['variables']['limit'] = 15
 
             try:
-                response = requests.post(self.base_url, json=json_data, stream=True, verify=False)
-                output[operation] = response.json()['data'] 
+                output[operation] = self._post(json_data)['data']
             except Exception as e:
-                logger.error(f'username: {username}', f'operation: {operation}', f'error: {e}', sep='\n')
+                logger.error(f'username: {username}, operation: {operation}, error: {e}')
 
 
         operation_query_dict = {
             'recentAcSubmissions':'\n    query recentAcSubmissions($username: String!, $limit: Int!) {\n  recentAcSubmissionList(username: $username, limit: $limit) {\n    id\n    title\n    titleSlug\n    timestamp\n  }\n}\n    ',
         }
 
-        with ThreadPoolExecutor(max_workers=len(operation_query_dict)) as executor:
-            executor.map(scrape_single_operation, operation_query_dict)
+        # a single operation, no need for a thread pool
+        for operation in operation_query_dict:
+            scrape_single_operation(operation)
+
+        return output
+
+    def scrape_users_recent_submissions(self, usernames, batch_size=20, limit=15):
+        """
+        Scrape the recent ac submissions of many users, packing a batch of users into one GraphQL document
+
+        each user gets its own aliased recentAcSubmissionList field, users whose field fails in the batch
+        are scraped again one by one
 
+        :param usernames: leetcode usernames to scrape
+        :type usernames: list[str]
+        :param batch_size: number of users packed into one request
+        :type batch_size: int
+        :param limit: number of recent ac submissions per user
+        :type limit: int
+
+        :return: username to output in the same shape as scrape_user_recent_submissions
+        :rtype: dict[str, dict]
+        """
+        usernames = list(dict.fromkeys(usernames))
+        output = {}
+        for start in range(0, len(usernames), batch_size):
+            output.update(self._scrape_recent_submissions_batch(usernames[start:start + batch_size], limit))
+        return output
+
+    def _scrape_recent_submissions_batch(self, usernames, limit):
+        variable_definitions = ['$limit: Int!']
+        fields = []
+        variables = {'limit': limit}
+        for index, username in enumerate(usernames):
+            variable_definitions.append(f'$username{index}: String!')
+            fields.append(f'  user{index}: recentAcSubmissionList(username: $username{index}, limit: $limit) {{\n    id\n    title\n    titleSlug\n    timestamp\n  }}')
+            variables[f'username{index}'] = username
+        json_data = {
+            'query': f'\n    query recentAcSubmissionsBatch({", ".join(variable_definitions)}) {{\n' + '\n'.join(fields) + '\n}\n    ',
+            'variables': variables,
+            'operationName': 'recentAcSubmissionsBatch',
+        }
+
+        try:
+            data = self._post(json_data).get('data') or {}
+        except Exception as e:
+            logger.error(f'batch of {len(usernames)} users, operation: recentAcSubmissionsBatch, error: {e}')
+            data = {}
+
+        output = {}
+        for index, username in enumerate(usernames):
+            submissions = data.get(f'user{index}')
+            if submissions is None:
+                # the field of this user failed, degrade to a single user request
+                logger.info(f'Batch failed for user {username}, fallback to single user request')
+                output[username] = self.scrape_user_recent_submissions(username)
+                continue
+            output[username] = {'recentAcSubmissions': {'recentAcSubmissionList': submissions}}
         return output
 
     def scrape_user_profile(self, username):
@@ -71,10 +385,9 @@ class LeetcodeScraper:
                 json_data['variables']['limit'] = 15
 
             try:
-                response = requests.post(self.base_url, json=json_data, stream=True, verify=False)
-                output[operation] = response.json()['data'] 
+                output[operation] = self._post(json_data)['data']
             except Exception as e:
-                logger.error(f'username: {username}', f'operation: {operation}', f'error: {e}', sep='\n')
+                logger.error(f'username: {username}, operation: {operation}, error: {e}')
 
 
         operation_query_dict = {
@@ -93,6 +406,38 @@ class LeetcodeScraper:
 
         return output
 
+    def iter_problemset_pages(self, page_size=100):
+        """
+        Page through the problem set listing, one request per page
+
+        a page that still fails after retries ends the listing early, the pages before it are already yielded
+
+        :param page_size: number of problems per request
+        :type page_size: int
+
+        :return: generator of (total number of problems, problem page), each problem has frontendQuestionId, title, titleSlug, difficulty, acRate and paidOnly
+        :rtype: Iterator[tuple[int, list[dict]]]
+        """
+        query = '\n    query problemsetQuestionList($categorySlug: String, $limit: Int, $skip: Int, $filters: QuestionListFilterInput) {\n  problemsetQuestionList: questionList(\n    categorySlug: $categorySlug\n    limit: $limit\n    skip: $skip\n    filters: $filters\n  ) {\n    total: totalNum\n    questions: data {\n      acRate\n      difficulty\n      frontendQuestionId: questionFrontendId\n      paidOnly: isPaidOnly\n      title\n      titleSlug\n    }\n  }\n}\n    '
+        skip = 0
+        total = None
+        while total is None or skip < total:
+            json_data = {
+                'query': query,
+                'variables': {'categorySlug': '', 'skip': skip, 'limit': page_size, 'filters': {}},
+                'operationName': 'problemsetQuestionList',
+            }
+            try:
+                data = self._post(json_data)['data']['problemsetQuestionList']
+            except Exception as e:
+                logger.error(f'Problem set listing failed at skip: {skip}, error: {e}')
+                return
+            total = data['total']
+            if not data['questions']:
+                return
+            yield total, data['questions']
+            skip += len(data['questions'])
+
     def _scrape_single_global_ranking_page(self, page_num, only_user_details=True):
         query = '''
         {
@@ -124,38 +469,218 @@ class LeetcodeScraper:
         ''' % page_num
         
         try:
-            response = requests.post(self.base_url, json={'query': query}, stream=True, verify=False)
-            data = response.json()['data']['globalRanking']
+            data = self._post({'query': query})['data']['globalRanking']
             if only_user_details:
                 return data['rankingNodes']
             else:
                 return data
         except Exception as e:
-            logger.error(f'Error in page number: {page_num}', f'Error: {e}', sep='\n')
+            logger.error(f'Error in page number: {page_num}, error: {e}')
 
-    def scrape_all_global_ranking_users(self):
+    def _scrape_global_ranking_summary(self):
+        """
+        Scrape the first global ranking page with the page count
+
+        :return: first page response and the number of pages
+        :rtype: tuple[dict, int]
+        """
         first_response = self._scrape_single_global_ranking_page(1, only_user_details=False)
         total_leetcode_global_ranking_users = first_response['totalUsers']
         users_per_page = first_response['userPerPage']
-        total_global_ranking_pages = total_leetcode_global_ranking_users // users_per_page
-        logger.info(f'Total Leetcode users: {total_leetcode_global_ranking_users}', f'Users per page: {users_per_page}', f'Total pages: {total_global_ranking_pages}', sep='\n')
+        # round up, the last page is usually not full
+        total_global_ranking_pages = -(-total_leetcode_global_ranking_users // users_per_page)
+        logger.info(f'Total Leetcode users: {total_leetcode_global_ranking_users}, users per page: {users_per_page}, total pages: {total_global_ranking_pages}')
+        return first_response, total_global_ranking_pages
+
+    def iter_global_ranking_pages(self, pages, window=None):
+        """
+        Scrape global ranking pages, yielding each page as soon as it completes
+
+        at most window pages are in flight, so memory is bounded by the window instead of the page count
+
+        :param pages: page numbers to scrape
+        :type pages: Iterable[int]
+        :param window: max number of pages in flight, the rate limiter concurrency bound if not given
+        :type window: int or None
+
+        :return: generator of (page number, ranking nodes or None if the page failed), in completion order
+        :rtype: Iterator[tuple[int, Optional[list]]]
+        """
+        window = window or self.rate_limiter.max_concurrency
+        pages = iter(pages)
+        with ThreadPoolExecutor(max_workers=window) as executor:
+            in_flight = {}
+            for page_num in pages:
+                in_flight[executor.submit(self._scrape_single_global_ranking_page, page_num)] = page_num
+                if len(in_flight) >= window:
+                    break
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield in_flight.pop(future), future.result()
+                    next_page_num = next(pages, None)
+                    if next_page_num is not None:
+                        in_flight[executor.submit(self._scrape_single_global_ranking_page, next_page_num)] = next_page_num
+
+    def crawl_global_ranking(self, sink, checkpoint_path, window=None):
+        """
+        Stream all global ranking pages into a sink, resuming from the pages recorded in the checkpoint
+
+        pages are written at least once, a page written right before a crash is written again on restart
+
+        :param sink: object with write_page(page_num, ranking_nodes), e.g. JsonlRankingSink
+        :param checkpoint_path: path of the checkpoint file of this crawl
+        :type checkpoint_path: str
+        :param window: max number of pages in flight
+        :type window: int or None
+
+        :return: crawl summary
+        :rtype: dict
+        """
+        first_response, total_global_ranking_pages = self._scrape_global_ranking_summary()
+        checkpoint = RankingCrawlCheckpoint(checkpoint_path)
+        skipped_pages = len(checkpoint.completed_pages)
+        scraped_users = 0
+        failed_pages = []
+        try:
+            if 1 not in checkpoint.completed_pages:
+                sink.write_page(1, first_response['rankingNodes'])
+                checkpoint.mark(1)
+                scraped_users += len(first_response['rankingNodes'])
+            pages = (page_num for page_num in range(2, total_global_ranking_pages + 1) if page_num not in checkpoint.completed_pages)
+            for page_num, ranking_nodes in self.iter_global_ranking_pages(pages, window):
+                if ranking_nodes is None:
+                    failed_pages.append(page_num)
+                    continue
+                sink.write_page(page_num, ranking_nodes)
+                checkpoint.mark(page_num)
+                scraped_users += len(ranking_nodes)
+        finally:
+            checkpoint.close()
+        if failed_pages:
+            logger.error(f'{len(failed_pages)} global ranking pages failed after retries, run the crawl again to resume: {failed_pages}')
+        return {
+            'total_global_ranking_users_present': first_response['totalUsers'],
+            'total_global_ranking_users_scraped': scraped_users,
+            'total_global_ranking_pages': total_global_ranking_pages,
+            'resumed_global_ranking_pages': skipped_pages,
+            'failed_global_ranking_pages': failed_pages,
+            'rate_limiter_stats': self.rate_limiter.get_stats(),
+        }
+
+    def scrape_all_global_ranking_users(self):
+        """
+        Scrape all global ranking users into memory, use crawl_global_ranking for a full sweep
+        """
+        first_response, total_global_ranking_pages = self._scrape_global_ranking_summary()
+        total_leetcode_global_ranking_users = first_response['totalUsers']
 
         final_response = first_response['rankingNodes']
+        failed_pages = []
 
-        with ThreadPoolExecutor(max_workers=500) as executor:
-            pages = range(2, total_global_ranking_pages + 1)
-            results = executor.map(self._scrape_single_global_ranking_page, pages)
-            for result in results:
-                if result:
-                    final_response.extend(result)
+        for page_num, result in self.iter_global_ranking_pages(range(2, total_global_ranking_pages + 1)):
+            if result:
+                final_response.extend(result)
+            else:
+                failed_pages.append(page_num)
+        if failed_pages:
+            logger.error(f'{len(failed_pages)} global ranking pages failed after retries: {failed_pages}')
         
         return {
             'total_global_ranking_users_present': total_leetcode_global_ranking_users,
             'total_global_ranking_users_scraped': len(final_response),
             'total_global_ranking_pages': total_global_ranking_pages,
-            'all_global_ranking_users': final_response
+            'failed_global_ranking_pages': failed_pages,
+            'all_global_ranking_users': final_response,
+            'rate_limiter_stats': self.rate_limiter.get_stats(),
         }
 
+class AsyncLeetcodeScraper:
+    """
+    Asyncio front end of LeetcodeScraper
+
+    the blocking requests of the wrapped scraper run on one thread pool per instance, at most max_concurrency
+    in flight, so coroutines can await them while the pooled session is reused and outputs keep the same shape
+    """
+
+    def __init__(self, server_region, max_concurrency=16, scraper=None):
+        """
+        Initialize the AsyncLeetcodeScraper
+
+        :param server_region: The server region to scrape the data from (US or CN)
+        :type server_region: str
+        :param max_concurrency: max number of requests in flight
+        :type max_concurrency: int
+        :param scraper: scraper used to send the requests, a new one of the region if not given
+        :type scraper: LeetcodeScraper or None
+        """
+        self.scraper = scraper if scraper is not None else LeetcodeScraper(server_region)
+        self.max_concurrency = max_concurrency
+        # started on first use, so processes forked before it get their own threads
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix=f'leetcode-{self.scraper.server_region}')
+            return self._executor
+
+    def close(self):
+        """
+        Shut the thread pool down, a later call starts a new one
+        """
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    async def _gather(self, func, args_list):
+        """
+        Run func over args_list on the thread pool, calls beyond max_concurrency wait for a free thread
+
+        :return: results in the order of args_list
+        :rtype: list
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        return await asyncio.gather(*(loop.run_in_executor(executor, func, *args) for args in args_list))
+
+    async def scrape_user_recent_submissions(self, username):
+        return (await self._gather(self.scraper.scrape_user_recent_submissions, [(username,)]))[0]
+
+    async def scrape_users_recent_submissions(self, usernames, batch_size=20, limit=15):
+        """
+        Scrape the recent ac submissions of many users, batches are sent concurrently
+
+        :return: username to output in the same shape as LeetcodeScraper.scrape_user_recent_submissions
+        :rtype: dict[str, dict]
+        """
+        usernames = list(dict.fromkeys(usernames))
+        batches = [usernames[start:start + batch_size] for start in range(0, len(usernames), batch_size)]
+        output = {}
+        results = await self._gather(self.scraper.scrape_users_recent_submissions, [(batch, batch_size, limit) for batch in batches])
+        for result in results:
+            output.update(result)
+        return output
+
+    async def scrape_users_profile(self, usernames):
+        """
+        Scrape the profile of many users concurrently
+
+        :return: username to output in the same shape as LeetcodeScraper.scrape_user_profile
+        :rtype: dict[str, dict]
+        """
+        usernames = list(dict.fromkeys(usernames))
+        results = await self._gather(self.scraper.scrape_user_profile, [(username,) for username in usernames])
+        return dict(zip(usernames, results))
+
 if __name__ == '__main__':
     username = input('Enter user to scrape recent submissions: ')
     server_region = input('Enter server region to scrape recent submissions: ')
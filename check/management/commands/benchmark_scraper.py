@@ -0,0 +1,163 @@
+"""
+Benchmark LeetcodeScraper and update_benchmark against the local fake leetcode api
+
+usage: python manage.py benchmark_scraper --users 200 --pages 100 --latency 0.05
+"""
+
+import time
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from check import leetcode_parser
+from check.fake_leetcode_server import FakeLeetcodeServer
+from check.leetcode_cache import ResponseCache
+from check.leetcode_scraper import RESPONSE_CACHE, LeetcodeScraper, RateLimiter
+from check.models import Schedule, ScheduleTypeChoices
+from member.googlesheet_parser import update_benchmark
+from member.models import LeetCodeSeverChoices, Member
+
+SCENARIOS = ['recent_submissions', 'batched_recent_submissions', 'profile', 'global_ranking', 'update_benchmark']
+
+class RollbackBenchmark(Exception):
+    """Raised to roll back the synthetic members of the update_benchmark scenario"""
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+class Command(BaseCommand):
+    help = 'Benchmark the leetcode scraper against a local fake leetcode GraphQL api'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help='number of synthetic members')
+        parser.add_argument('--pages', type=int, default=100, help='number of global ranking pages')
+        parser.add_argument('--latency', type=float, default=0.02, help='mean server latency in seconds')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of 500 responses')
+        parser.add_argument('--throttle-rate', type=float, default=0.0, help='fraction of 429 responses')
+        parser.add_argument('--rate', type=float, default=1000.0, help='rate limiter tokens per second')
+        parser.add_argument('--concurrency', type=int, default=32, help='max requests in flight')
+        parser.add_argument('--no-cache', action='store_true', help='disable the response cache')
+        parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+
+    def handle(self, *args, **options):
+        fake_server = FakeLeetcodeServer(
+            latency=options['latency'],
+            error_rate=options['error_rate'],
+            throttle_rate=options['throttle_rate'],
+            total_users=options['pages'] * 25,
+            users_per_page=25,
+        )
+        usernames = [f'member{index}' for index in range(options['users'])]
+        with fake_server:
+            scraper = LeetcodeScraper(
+                'US',
+                base_url=fake_server.url,
+                backoff_factor=0.01,
+                cache=None if options['no_cache'] else ResponseCache(),
+                rate_limiter=RateLimiter(rate=options['rate'], burst=options['concurrency'], max_concurrency=options['concurrency']),
+            )
+            self.stdout.write(f"{'scenario':<28}{'requests':>10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'peak MiB':>10}{'seconds':>10}")
+            for scenario in options['scenarios']:
+                if scenario == 'recent_submissions':
+                    result = self.run(fake_server, [scraper], lambda: [scraper.scrape_user_recent_submissions(username) for username in usernames])
+                elif scenario == 'batched_recent_submissions':
+                    result = self.run(fake_server, [scraper], lambda: scraper.scrape_users_recent_submissions(usernames))
+                elif scenario == 'profile':
+                    result = self.run(fake_server, [scraper], lambda: [scraper.scrape_user_profile(username) for username in usernames])
+                elif scenario == 'global_ranking':
+                    result = self.run(fake_server, [scraper], scraper.scrape_all_global_ranking_users)
+                else:
+                    result = self.run_update_benchmark(fake_server, usernames, options)
+                self.stdout.write(
+                    f"{scenario:<28}{result['requests']:>10}{result['requests'] / result['seconds']:>10.1f}"
+                    f"{result['p50'] * 1000:>10.1f}{result['p99'] * 1000:>10.1f}{result['peak_memory'] / 2**20:>10.1f}{result['seconds']:>10.2f}"
+                )
+            self.stdout.write(f'server: {fake_server.get_stats()}, rate limiter: {scraper.rate_limiter.get_stats()}')
+            if 'update_benchmark' in options['scenarios']:
+                self.stdout.write(f'problem catalog lookups: {leetcode_parser.get_problem_catalog_stats()}')
+
+    def run(self, fake_server, scrapers, func):
+        """
+        Run func once, timing every http request sent by the scrapers
+
+        :return: request count, latency percentiles, peak traced memory and elapsed seconds
+        :rtype: dict
+        """
+        latencies = []
+        for scraper in scrapers:
+            # start cold, the caches of the benchmark are private, the shared one is never cleared
+            if scraper.cache is not None and scraper.cache is not RESPONSE_CACHE:
+                scraper.cache.clear()
+            send = scraper._send
+
+            def timed_send(json_data, send=send):
+                start = time.perf_counter()
+                try:
+                    return send(json_data)
+                finally:
+                    latencies.append(time.perf_counter() - start)
+            scraper._send = timed_send
+        fake_server.reset_counters()
+        tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            func()
+        finally:
+            seconds = time.perf_counter() - start
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            for scraper in scrapers:
+                del scraper._send
+        return {
+            'requests': fake_server.get_stats()['requests'],
+            'p50': percentile(latencies, 0.5),
+            'p99': percentile(latencies, 0.99),
+            'peak_memory': peak_memory,
+            'seconds': max(seconds, 1e-9),
+        }
+
+    def run_update_benchmark(self, fake_server, usernames, options):
+        """
+        Run update_benchmark over synthetic members pointed at the fake api, everything is rolled back afterwards
+
+        the shared scrapers get a private response cache and rate limiter for the run, so the fake responses
+        never reach the shared cache and the run does not use up the request budget of the real api
+        """
+        scrapers = [leetcode_parser.LEETCODE_SCRAPER_US, leetcode_parser.LEETCODE_SCRAPER_CN]
+        original_settings = [(scraper.base_url, scraper.cache, scraper.rate_limiter) for scraper in scrapers]
+        result = None
+        try:
+            with transaction.atomic():
+                # load the catalog before timing
+                leetcode_parser.get_catalog_problem_by_code(1)
+                members = []
+                for username in usernames:
+                    member = Member.objects.create(
+                        user_id=User.objects.create_user(username=f'benchmark-{username}', password=None),
+                        leetcode_username=username,
+                        server_region=LeetCodeSeverChoices.US,
+                    )
+                    Schedule.objects.create(member_id=member, schedule_type=ScheduleTypeChoices.FREE, goals=65535)
+                    members.append(member)
+                for scraper in scrapers:
+                    scraper.base_url = fake_server.url
+                    scraper.cache = None if options['no_cache'] else ResponseCache()
+                    scraper.rate_limiter = RateLimiter(rate=options['rate'], burst=options['concurrency'], max_concurrency=options['concurrency'])
+                # only the synthetic members, real members must not be scraped from the fake api
+                result = self.run(fake_server, scrapers, lambda: update_benchmark(members=members))
+                raise RollbackBenchmark()
+        except RollbackBenchmark:
+            pass
+        finally:
+            # the index may hold catalog problems created inside the rolled back transaction
+            leetcode_parser.invalidate_problem_catalog_index()
+            for scraper, (base_url, cache, rate_limiter) in zip(scrapers, original_settings):
+                scraper.base_url = base_url
+                scraper.cache = cache
+                scraper.rate_limiter = rate_limiter
+        return result
@@ -0,0 +1,27 @@
+"""
+Write the problem catalog into the binary snapshot mapped by the workers
+
+usage: python manage.py build_catalog_snapshot --sync
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from check import leetcode_parser
+
+class Command(BaseCommand):
+    help = 'Write the problem catalog into a binary snapshot, mapped by the workers at startup'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=None, help=f'snapshot file, {leetcode_parser.PROBLEM_CATALOG_SNAPSHOT_PATH} by default')
+        parser.add_argument('--sync', action='store_true', help='sync the problem catalog from leetcode first')
+
+    def handle(self, *args, **options):
+        if options['sync']:
+            result = leetcode_parser.sync_problem_catalog()
+            self.stdout.write(f"synced problem catalog: {result}")
+        start = time.perf_counter()
+        count = leetcode_parser.build_problem_catalog_snapshot(options['path'])
+        path = options['path'] or leetcode_parser.PROBLEM_CATALOG_SNAPSHOT_PATH
+        self.stdout.write(f'wrote {count} catalog problems to {path} in {time.perf_counter() - start:.2f} seconds')
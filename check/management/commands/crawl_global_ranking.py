@@ -0,0 +1,43 @@
+"""
+Crawl the global ranking of leetcode into a jsonl file, resumable from its checkpoint
+
+usage: python manage.py crawl_global_ranking --output ranking.jsonl --snapshot ranking.snapshot
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from check.leetcode_scraper import JsonlRankingSink, LeetcodeScraper
+from check.ranking_snapshot import read_jsonl_ranking_nodes, write_ranking_snapshot
+
+class Command(BaseCommand):
+    help = 'Stream the global ranking pages into a jsonl file, run it again to resume an interrupted crawl'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', required=True, help='jsonl file the ranking nodes are appended to')
+        parser.add_argument('--checkpoint', default=None, help='file of the pages already written, OUTPUT.checkpoint by default')
+        parser.add_argument('--region', choices=['US', 'CN'], default='US', help='server region to crawl')
+        parser.add_argument('--window', type=int, default=None, help='max pages in flight')
+        parser.add_argument('--base-url', default=None, help='GraphQL endpoint, the leetcode site of the region by default')
+        parser.add_argument('--snapshot', default=None, help='ranking snapshot file to write once every page is crawled')
+
+    def handle(self, *args, **options):
+        checkpoint_path = options['checkpoint'] or f"{options['output']}.checkpoint"
+        scraper = LeetcodeScraper(options['region'], base_url=options['base_url'])
+        start = time.perf_counter()
+        sink = JsonlRankingSink(options['output'])
+        try:
+            result = scraper.crawl_global_ranking(sink, checkpoint_path, options['window'])
+        finally:
+            sink.close()
+        self.stdout.write(
+            f"scraped {result['total_global_ranking_users_scraped']} of {result['total_global_ranking_users_present']} users "
+            f"from {result['total_global_ranking_pages']} pages, {result['resumed_global_ranking_pages']} pages resumed "
+            f"from {checkpoint_path}, in {time.perf_counter() - start:.2f} seconds"
+        )
+        if result['failed_global_ranking_pages']:
+            raise CommandError(f"{len(result['failed_global_ranking_pages'])} pages failed, run the command again to resume: {result['failed_global_ranking_pages']}")
+        if options['snapshot']:
+            count = write_ranking_snapshot(read_jsonl_ranking_nodes(options['output']), options['snapshot'])
+            self.stdout.write(f"wrote {count} users to the ranking snapshot {options['snapshot']}")
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.16 on 2026-10-17 12:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("check", "0008_schedule_sheet_row"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="problem",
+            index=models.Index(fields=["proof_url"], name="problem_proof_url_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="problem",
+            index=models.Index(fields=["problem_title"], name="problem_title_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="problem",
+            index=models.Index(
+                fields=["schedule_id", "problem_code"], name="problem_schedule_code_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="problem",
+            index=models.Index(
+                fields=["status", "done_date"],
+                include=("schedule_id",),
+                name="problem_status_done_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="schedule",
+            index=models.Index(fields=["schedule_type"], name="schedule_type_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="schedule",
+            index=models.Index(
+                fields=["member_id", "schedule_type", "-start_date"],
+                name="schedule_member_type_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.16 on 2026-10-17 12:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("check", "0009_query_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProblemCatalog",
+            fields=[
+                (
+                    "problem_code",
+                    models.IntegerField(primary_key=True, serialize=False),
+                ),
+                ("problem_title", models.CharField(db_index=True, max_length=256)),
+                ("problem_slug", models.CharField(max_length=256)),
+                (
+                    "difficulty",
+                    models.CharField(
+                        choices=[
+                            ("Easy", "Easy"),
+                            ("Medium", "Medium"),
+                            ("Hard", "Hard"),
+                        ],
+                        max_length=6,
+                        null=True,
+                    ),
+                ),
+                ("acceptance_rate", models.FloatField(null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="problem",
+            name="catalog_id",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                to="check.problemcatalog",
+            ),
+        ),
+    ]
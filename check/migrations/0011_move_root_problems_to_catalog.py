@@ -0,0 +1,75 @@
+import csv
+import os
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import F
+
+
+def read_csv_details():
+    """
+    Read the difficulty and acceptance rate of every problem code from static/leetcode_problem.csv
+    """
+    csv_details = {}
+    csv_path = os.path.join(settings.BASE_DIR, "static", "leetcode_problem.csv")
+    if not os.path.exists(csv_path):
+        return csv_details
+    with open(csv_path, "r") as file:
+        for row in csv.reader(file):
+            if len(row) < 4:
+                continue
+            # titles with a comma are not quoted, and some rows swap difficulty and acceptance rate
+            difficulty = next((value for value in row[-2:] if value in ("Easy", "Medium", "Hard")), None)
+            acceptance_rate = next((value for value in row[-2:] if value.endswith("%")), None)
+            try:
+                csv_details[int(row[0])] = (difficulty, float(acceptance_rate.rstrip("%")) if acceptance_rate else None)
+            except ValueError:
+                continue
+    return csv_details
+
+
+def move_root_problems_to_catalog(apps, schema_editor):
+    """
+    Copy the problems of the root schedule into ProblemCatalog, link every other problem to its entry by code,
+    then delete the root schedule with its problems
+    """
+    Problem = apps.get_model("check", "Problem")
+    ProblemCatalog = apps.get_model("check", "ProblemCatalog")
+    Schedule = apps.get_model("check", "Schedule")
+
+    # difficulty and acceptance rate were never stored, read them from the csv
+    csv_details = read_csv_details()
+
+    catalog = {}
+    # root problems first, so their titles and slugs win over the copies in member schedules
+    for problem in Problem.objects.filter(schedule_id__schedule_type="ROOT").order_by("id"):
+        catalog.setdefault(problem.problem_code, problem)
+    for problem in Problem.objects.exclude(schedule_id__schedule_type="ROOT").order_by("id"):
+        catalog.setdefault(problem.problem_code, problem)
+    ProblemCatalog.objects.bulk_create(
+        [
+            ProblemCatalog(
+                problem_code=problem_code,
+                problem_title=problem.problem_title,
+                problem_slug=problem.problem_slug,
+                difficulty=csv_details.get(problem_code, (None, None))[0],
+                acceptance_rate=csv_details.get(problem_code, (None, None))[1],
+            )
+            for problem_code, problem in catalog.items()
+        ],
+        batch_size=1000,
+    )
+    Problem.objects.exclude(schedule_id__schedule_type="ROOT").update(catalog_id=F("problem_code"))
+    # the root schedule cascades to its problems
+    Schedule.objects.filter(schedule_type="ROOT").delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("check", "0010_problemcatalog"),
+    ]
+
+    operations = [
+        migrations.RunPython(move_root_problems_to_catalog),
+    ]
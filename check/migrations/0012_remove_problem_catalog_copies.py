@@ -0,0 +1,48 @@
+# Generated by Django 4.2.16 on 2026-10-17 12:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("check", "0011_move_root_problems_to_catalog"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="problem",
+            name="problem_title_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="problem",
+            name="problem_schedule_code_idx",
+        ),
+        migrations.RemoveField(
+            model_name="problem",
+            name="problem_code",
+        ),
+        migrations.RemoveField(
+            model_name="problem",
+            name="problem_slug",
+        ),
+        migrations.RemoveField(
+            model_name="problem",
+            name="problem_title",
+        ),
+        migrations.AlterField(
+            model_name="problem",
+            name="catalog_id",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT, to="check.problemcatalog"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="problem",
+            index=models.Index(
+                fields=["schedule_id", "catalog_id"],
+                name="problem_schedule_catalog_idx",
+            ),
+        ),
+    ]
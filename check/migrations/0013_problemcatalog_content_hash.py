@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-17 13:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("check", "0012_remove_problem_catalog_copies"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="problemcatalog",
+            name="content_hash",
+            field=models.CharField(max_length=40, null=True),
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 4.2.16 on 2026-10-17 13:05
+
+from datetime import datetime, time, timedelta
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+import django.db.models.deletion
+
+
+def count_member_stats(apps, schema_editor):
+    """
+    Fill the stats of every member with ac problems, so the rankings read from them are complete from the start
+    """
+    Member = apps.get_model("member", "Member")
+    MemberStats = apps.get_model("check", "MemberStats")
+    Problem = apps.get_model("check", "Problem")
+    today = timezone.localdate()
+    ac_filter = Q(schedule__problem__status="AC")
+    # local midnight 1 and 7 days back, like check.leaderboard.window_start
+    daily_start, weekly_start = (
+        timezone.make_aware(datetime.combine(today - timedelta(days=days), time.min)) for days in (1, 7)
+    )
+    stats = {}
+    for row in (
+        Member.objects.annotate(
+            all_time_count=Count("schedule__problem", filter=ac_filter),
+            daily_count=Count("schedule__problem", filter=ac_filter & Q(schedule__problem__done_date__gte=daily_start)),
+            weekly_count=Count("schedule__problem", filter=ac_filter & Q(schedule__problem__done_date__gte=weekly_start)),
+            last_ac_time=Max("schedule__problem__done_date", filter=ac_filter),
+        )
+        .filter(all_time_count__gt=0)
+        .values("id", "all_time_count", "daily_count", "weekly_count", "last_ac_time")
+    ):
+        member_id = row.pop("id")
+        stats[member_id] = MemberStats(member_id_id=member_id, computed_for=today, **row)
+    ac_days = {}
+    for member_id, day in (
+        Problem.objects.filter(status="AC", done_date__isnull=False)
+        .annotate(day=TruncDate("done_date"))
+        .values_list("schedule_id__member_id", "day")
+        .distinct()
+    ):
+        ac_days.setdefault(member_id, set()).add(day)
+    for member_id, days in ac_days.items():
+        if member_id not in stats:
+            continue
+        # consecutive days ending on the latest one
+        last_day = max(days)
+        streak_days = 1
+        while last_day - timedelta(days=streak_days) in days:
+            streak_days += 1
+        stats[member_id].streak_days, stats[member_id].streak_last_date = streak_days, last_day
+    MemberStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("member", "0008_serveroperations_timestamp_index"),
+        ("check", "0013_problemcatalog_content_hash"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MemberStats",
+            fields=[
+                (
+                    "member_id",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        serialize=False,
+                        to="member.member",
+                    ),
+                ),
+                ("daily_count", models.IntegerField(default=0)),
+                ("weekly_count", models.IntegerField(default=0)),
+                ("all_time_count", models.IntegerField(default=0)),
+                ("computed_for", models.DateField()),
+                ("last_ac_time", models.DateTimeField(null=True)),
+                ("streak_days", models.IntegerField(default=0)),
+                ("streak_last_date", models.DateField(null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(count_member_stats, migrations.RunPython.noop),
+    ]
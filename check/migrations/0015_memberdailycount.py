@@ -0,0 +1,75 @@
+# Generated by Django 4.2.16 on 2026-10-17 13:13
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+import django.db.models.deletion
+
+
+def count_ac_problems_per_day(apps, schema_editor):
+    """
+    Fill the daily counts from the dated ac problems, so the windows can be rolled over from them at once
+    """
+    MemberDailyCount = apps.get_model("check", "MemberDailyCount")
+    Problem = apps.get_model("check", "Problem")
+    MemberDailyCount.objects.bulk_create(
+        [
+            MemberDailyCount(member_id_id=row["schedule_id__member_id"], day=row["day"], count=row["count"])
+            for row in (
+                Problem.objects.filter(status="AC", done_date__isnull=False)
+                .annotate(day=TruncDate("done_date"))
+                .values("schedule_id__member_id", "day")
+                .annotate(count=Count("id"))
+            )
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("member", "0009_syncjob"),
+        ("check", "0014_memberstats"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MemberDailyCount",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("count", models.IntegerField(default=0)),
+                (
+                    "member_id",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="member.member"
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["day"],
+                        include=("member_id", "count"),
+                        name="memberdailycount_day_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="memberdailycount",
+            constraint=models.UniqueConstraint(
+                fields=("member_id", "day"), name="memberdailycount_member_day_unique"
+            ),
+        ),
+        migrations.RunPython(count_ac_problems_per_day, migrations.RunPython.noop),
+    ]
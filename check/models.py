@@ -12,7 +12,7 @@ class ScheduleTypeChoices(models.TextChoices):
     FREE = "FREE", _("Free")
     # normal schedule, with goals
     NORMAL = "NORMAL", _("Normal")
-    # root schedule, used for problem list
+    # root schedule, used for problem list before ProblemCatalog, kept for old migrations
     ROOT = "ROOT", _("Root")
 
 
@@ -41,6 +41,14 @@ class Schedule(models.Model):
     # expire date is None for default schedule
     expire_date = models.DateTimeField(null=True)
 
+    class Meta:
+        indexes = [
+            # schedules by type
+            models.Index(fields=["schedule_type"], name="schedule_type_idx"),
+            # latest free schedule of a member
+            models.Index(fields=["member_id", "schedule_type", "-start_date"], name="schedule_member_type_idx"),
+        ]
+
     def __str__(self):
         return f"{self.member_id} - {self.start_date} - {self.expire_date}"
 
@@ -49,6 +57,28 @@ class ProblemStatusChoices(models.TextChoices):
     NA = "NA", _("Not Attempted")
     SP = "SP", _("Sample Problem")
 
+class ProblemDifficultyChoices(models.TextChoices):
+    EASY = "Easy", _("Easy")
+    MEDIUM = "Medium", _("Medium")
+    HARD = "Hard", _("Hard")
+
+class ProblemCatalog(models.Model):
+    """Problem list of leetcode, shared by the problems of all schedules"""
+
+    # the leetcode frontend problem id
+    problem_code = models.IntegerField(primary_key=True)
+    problem_title= models.CharField(null=False,max_length=256,db_index=True)
+    # guessed from the title until a submission corrects it
+    problem_slug= models.CharField(null=False,max_length=256)
+    difficulty = models.CharField(choices=ProblemDifficultyChoices.choices,null=True,max_length=6)
+    # percentage of accepted submissions
+    acceptance_rate = models.FloatField(null=True)
+    # hash of the fields above as last synced from leetcode, null until the first sync
+    content_hash = models.CharField(null=True,max_length=40)
+
+    def __str__(self):
+        return f"{self.problem_code}. {self.problem_title}"
+
 class Problem(models.Model):
     
     schedule_id = models.ForeignKey(
@@ -57,9 +87,12 @@ class Problem(models.Model):
         on_delete=models.CASCADE,
         null=False,
     )
-    problem_code = models.IntegerField(null=False)
-    problem_title= models.CharField(null=False,max_length=256)
-    problem_slug= models.CharField(null=False,max_length=256)
+    catalog_id = models.ForeignKey(
+        ProblemCatalog,
+        # problems of schedules keep the catalog entry alive
+        on_delete=models.PROTECT,
+        null=False,
+    )
     # is the problem ac or not
     status=models.CharField(choices=ProblemStatusChoices.choices,default=ProblemStatusChoices.NA,null=False,max_length=2)
     # when the problem is done, timestamp       
@@ -67,6 +100,66 @@ class Problem(models.Model):
     # the url of the proof for recent AC
     proof_url = models.CharField(null=True,max_length=256)
 
+    class Meta:
+        indexes = [
+            # dedupe of submissions by proof url
+            models.Index(fields=["proof_url"], name="problem_proof_url_idx"),
+            # problems of a schedule by catalog entry
+            models.Index(fields=["schedule_id", "catalog_id"], name="problem_schedule_catalog_idx"),
+            # leaderboards, covering the schedule so ac counts per member need no heap access on postgres
+            models.Index(fields=["status", "done_date"], include=["schedule_id"], name="problem_status_done_idx"),
+        ]
+
     def __str__(self):
-        return f"{self.schedule_id} - {self.problem_code} - {self.problem_title} - {self.status}"
+        return f"{self.schedule_id} - {self.catalog_id} - {self.status}"
+
 
+class MemberStats(models.Model):
+    """Leaderboard counters of a member, updated with every ac problem and rebuilt by the reconcile task"""
+
+    member_id = models.OneToOneField(
+        Member,
+        # when member is delete, the stats would also be deleted
+        on_delete=models.CASCADE,
+        primary_key=True,
+    )
+    # ac problems in each window of check.leaderboard.LEADERBOARD_WINDOWS, counted back from computed_for
+    daily_count = models.IntegerField(default=0, null=False)
+    weekly_count = models.IntegerField(default=0, null=False)
+    all_time_count = models.IntegerField(default=0, null=False)
+    # local date the window counts are counted back from, they expire the next day
+    computed_for = models.DateField(null=False)
+    last_ac_time = models.DateTimeField(null=True)
+    # consecutive local days with an ac problem, ending on streak_last_date
+    streak_days = models.IntegerField(default=0, null=False)
+    streak_last_date = models.DateField(null=True)
+    updated_at = models.DateTimeField(auto_now=True, null=False)
+
+    def __str__(self):
+        return f"{self.member_id} - {self.daily_count}/{self.weekly_count}/{self.all_time_count}"
+
+
+class MemberDailyCount(models.Model):
+    """Ac problems of a member per local day, summed into the rolling ranking windows"""
+
+    member_id = models.ForeignKey(
+        Member,
+        # when member is delete, the counts would also be deleted
+        on_delete=models.CASCADE,
+        null=False,
+    )
+    # local date of the done date of the problems
+    day = models.DateField(null=False)
+    count = models.IntegerField(default=0, null=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["member_id", "day"], name="memberdailycount_member_day_unique"),
+        ]
+        indexes = [
+            # window sums, covering the member and count so only the buckets of the window are read on postgres
+            models.Index(fields=["day"], include=["member_id", "count"], name="memberdailycount_day_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.member_id} - {self.day}: {self.count}"
@@ -0,0 +1,250 @@
+"""
+This file is used to store global ranking snapshots in a compact columnar file opened via mmap
+
+Helper modules only, do not do and server operations
+
+file layout: a header, then one 8-byte aligned section per column, rows are sorted by rating from high to low
+
+- rating: float64, ranking and global_rank: int32, data_region: uint8
+- username and country: uint32 references into a string table (uint32 offsets + utf8 data)
+- username_order: uint32 row indexes sorted by username, for binary search lookup
+"""
+
+from array import array
+import json
+import mmap
+import os
+import struct
+import sys
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'LCRS'
+VERSION = 1
+# magic, version, byte order (0 little, 1 big), row count, section count
+HEADER = struct.Struct('<4sIBxxxQI')
+# offset and length in bytes of each section
+SECTION = struct.Struct('<QQ')
+SECTIONS = ['rating', 'ranking', 'global_rank', 'data_region', 'username', 'country', 'string_offsets', 'string_data', 'username_order']
+SECTION_FORMATS = {
+    'rating': 'd', 'ranking': 'i', 'global_rank': 'i', 'data_region': 'B',
+    'username': 'I', 'country': 'I', 'string_offsets': 'I', 'string_data': 'B', 'username_order': 'I',
+}
+DATA_REGIONS = ['US', 'CN']
+
+def read_jsonl_ranking_nodes(path):
+    """
+    Read the ranking nodes written by JsonlRankingSink one at a time
+
+    :param path: path of the jsonl file
+    :type path: str
+
+    :return: generator of ranking nodes
+    :rtype: Iterator[dict]
+    """
+    with open(path, 'r', encoding='utf8') as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+def write_ranking_snapshot(ranking_nodes, path)->int:
+    """
+    Write global ranking nodes into a columnar snapshot, duplicated usernames keep their first node
+
+    the file is written next to path and moved over it, readers never map a partially written snapshot
+
+    :param ranking_nodes: ranking nodes as returned by the globalRanking query
+    :type ranking_nodes: Iterable[dict]
+    :param path: path of the snapshot file
+    :type path: str
+
+    :return: number of rows written
+    :rtype: int
+    """
+    ratings, rankings, global_ranks, data_regions = array('d'), array('i'), array('i'), array('B')
+    username_refs, country_refs = array('I'), array('I')
+    string_ids = {}
+    strings = []
+    usernames = set()
+
+    def string_id(value):
+        if value not in string_ids:
+            string_ids[value] = len(strings)
+            strings.append(value.encode('utf8'))
+        return string_ids[value]
+
+    for node in ranking_nodes:
+        user = node.get('user') or {}
+        username = user.get('username')
+        if username is None or username in usernames:
+            continue
+        usernames.add(username)
+        profile = user.get('profile') or {}
+        ratings.append(float(node.get('currentRating') or 0))
+        rankings.append(int(node.get('ranking') or 0))
+        global_ranks.append(int(node.get('currentGlobalRanking') or 0))
+        data_region = node.get('dataRegion')
+        data_regions.append(DATA_REGIONS.index(data_region) if data_region in DATA_REGIONS else len(DATA_REGIONS))
+        username_refs.append(string_id(username))
+        country_refs.append(string_id(profile.get('countryName') or ''))
+    usernames.clear()
+
+    count = len(ratings)
+    order = sorted(range(count), key=ratings.__getitem__, reverse=True)
+    columns = {
+        'rating': array('d', (ratings[row] for row in order)),
+        'ranking': array('i', (rankings[row] for row in order)),
+        'global_rank': array('i', (global_ranks[row] for row in order)),
+        'data_region': array('B', (data_regions[row] for row in order)),
+        'username': array('I', (username_refs[row] for row in order)),
+        'country': array('I', (country_refs[row] for row in order)),
+    }
+    del order, ratings, rankings, global_ranks, data_regions, username_refs, country_refs
+    string_offsets = array('I', [0])
+    for value in strings:
+        string_offsets.append(string_offsets[-1] + len(value))
+    columns['string_offsets'] = string_offsets
+    columns['string_data'] = b''.join(strings)
+    username_column = columns['username']
+    columns['username_order'] = array('I', sorted(range(count), key=lambda row: strings[username_column[row]]))
+
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'wb') as file:
+        offset = HEADER.size + SECTION.size * len(SECTIONS)
+        section_table = []
+        payloads = []
+        for name in SECTIONS:
+            payload = bytes(columns[name]) if name == 'string_data' else columns[name].tobytes()
+            offset += -offset % 8
+            section_table.append((offset, len(payload)))
+            payloads.append((offset, payload))
+            offset += len(payload)
+        file.write(HEADER.pack(MAGIC, VERSION, 0 if sys.byteorder == 'little' else 1, count, len(SECTIONS)))
+        for section_offset, length in section_table:
+            file.write(SECTION.pack(section_offset, length))
+        for section_offset, payload in payloads:
+            file.write(b'\0' * (section_offset - file.tell()))
+            file.write(payload)
+    os.replace(temporary_path, path)
+    logger.info(f'Wrote global ranking snapshot of {count} users to {path}')
+    return count
+
+class RankingSnapshot:
+    """
+    Read-only view of a global ranking snapshot, columns are memory-mapped and never loaded as python objects
+    """
+
+    def __init__(self, path):
+        """
+        Open the snapshot
+
+        :param path: path of the snapshot file
+        :type path: str
+
+        :raises ValueError: If the file is not a snapshot of this version and byte order
+        """
+        self.file = open(path, 'rb')
+        self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, byte_order, count, section_count = HEADER.unpack_from(self.mmap, 0)
+        if magic != MAGIC or version != VERSION or section_count != len(SECTIONS):
+            self.close()
+            raise ValueError(f'Invalid global ranking snapshot: {path}')
+        if byte_order != (0 if sys.byteorder == 'little' else 1):
+            self.close()
+            raise ValueError(f'Global ranking snapshot {path} was written with another byte order')
+        self.count = count
+        buffer = memoryview(self.mmap)
+        self.columns = {}
+        for index, name in enumerate(SECTIONS):
+            offset, length = SECTION.unpack_from(self.mmap, HEADER.size + SECTION.size * index)
+            self.columns[name] = buffer[offset:offset + length].cast(SECTION_FORMATS[name])
+
+    def close(self):
+        # views must be released before the mmap can be closed
+        for column in getattr(self, 'columns', {}).values():
+            column.release()
+        self.columns = {}
+        self.mmap.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def _string(self, string_id)->str:
+        offsets = self.columns['string_offsets']
+        return bytes(self.columns['string_data'][offsets[string_id]:offsets[string_id + 1]]).decode('utf8')
+
+    def _username_bytes(self, row)->bytes:
+        offsets = self.columns['string_offsets']
+        string_id = self.columns['username'][row]
+        return bytes(self.columns['string_data'][offsets[string_id]:offsets[string_id + 1]])
+
+    def row(self, row)->dict:
+        data_region = self.columns['data_region'][row]
+        return {
+            'username': self._string(self.columns['username'][row]),
+            'rating': self.columns['rating'][row],
+            'ranking': self.columns['ranking'][row],
+            'global_rank': self.columns['global_rank'][row],
+            'data_region': DATA_REGIONS[data_region] if data_region < len(DATA_REGIONS) else None,
+            'country': self._string(self.columns['country'][row]),
+        }
+
+    def lookup(self, username)->dict:
+        """
+        Find a user by username with a binary search
+
+        :return: row of the user, None if not in the snapshot
+        :rtype: dict or None
+        """
+        target = username.encode('utf8')
+        order = self.columns['username_order']
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._username_bytes(order[middle]) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and self._username_bytes(order[low]) == target:
+            return self.row(order[low])
+        return None
+
+    def top_k(self, k)->list[dict]:
+        """
+        :return: the k users with the highest rating
+        :rtype: list[dict]
+        """
+        return [self.row(row) for row in range(min(k, self.count))]
+
+    def count_rating_above(self, rating)->int:
+        """
+        :return: number of users with a rating strictly higher than rating
+        :rtype: int
+        """
+        ratings = self.columns['rating']
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if ratings[middle] > rating:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def percentile(self, rating)->float:
+        """
+        :return: percentage of users with a rating lower than or equal to rating
+        :rtype: float
+        """
+        if self.count == 0:
+            return 0.0
+        return 100.0 * (self.count - self.count_rating_above(rating)) / self.count
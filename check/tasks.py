@@ -0,0 +1,29 @@
+# Create your tasks here
+
+from celery import shared_task
+from check.leaderboard import rebuild_member_stats
+from check.leetcode_parser import build_problem_catalog_snapshot, sync_problem_catalog
+from main.celery import app  # Import the Celery app
+
+@shared_task
+def sync_problem_catalog_task():
+    result = sync_problem_catalog()
+    # workers started from now on map the synced catalog
+    if result['created'] or result['updated']:
+        build_problem_catalog_snapshot()
+
+@shared_task
+def reconcile_member_stats_task():
+    rebuild_member_stats()
+
+# Sync the problem catalog from leetcode every day (86400 seconds)
+app.conf.beat_schedule = app.conf.get('beat_schedule', {})
+app.conf.beat_schedule['sync_problem_catalog_task'] = {
+    'task': 'check.tasks.sync_problem_catalog_task',
+    'schedule': 86400.0,
+}
+# Rebuild the member stats from the problems and report drift every hour (3600 seconds)
+app.conf.beat_schedule['reconcile_member_stats_task'] = {
+    'task': 'check.tasks.reconcile_member_stats_task',
+    'schedule': 3600.0,
+}
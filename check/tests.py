@@ -1,3 +1,718 @@
-from django.test import TestCase
+import base64
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+import importlib
+from io import StringIO
+import json
+import os
+import tempfile
+from unittest import mock, skipUnless
+
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.template.defaultfilters import slugify
+from django.urls import reverse
+from django.utils import timezone
+import requests
+
+from check import leetcode_parser
+from check.catalog_snapshot import CatalogSnapshot, write_catalog_snapshot
+from check.leaderboard import (
+    bump_leaderboard_version, get_days_leaderboard_page, get_leaderboard_page, get_leaderboards, get_stats_leaderboards,
+    rebuild_member_stats, record_ac_problems,
+)
+from check.leaderboard_stream import LeaderboardHub
+from check.leetcode_cache import ResponseCache
+from check.fake_leetcode_server import FakeLeetcodeServer, load_problems
+from check.leetcode_scraper import AsyncLeetcodeScraper, JsonlRankingSink, LeetcodeScraper, RateLimiter
+from check.models import MemberDailyCount, MemberStats, Problem, ProblemCatalog, ProblemStatusChoices, Schedule, ScheduleTypeChoices
+from check.ranking_snapshot import RankingSnapshot, write_ranking_snapshot
+from member.models import Member, ServerOperations
 
 # Create your tests here.
+
+@skipUnless(connection.vendor == 'postgresql', 'query plans are checked against postgres only')
+class QueryPlanTests(TestCase):
+    """
+    Run EXPLAIN on the hot queries and fail if they regress to sequential scans
+
+    the seeded tables are small, so sequential scans are disabled to check an index is usable at all
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username='member', password=None)
+        cls.member = Member.objects.create(user_id=user, leetcode_username='member')
+        cls.normal_schedule = Schedule.objects.create(member_id=cls.member, schedule_type=ScheduleTypeChoices.NORMAL, goals=10)
+        cls.free_schedule = Schedule.objects.create(member_id=cls.member, schedule_type=ScheduleTypeChoices.FREE, goals=65535)
+        now = timezone.now()
+        ProblemCatalog.objects.bulk_create([
+            ProblemCatalog(problem_code=code, problem_title=f'Problem {code}', problem_slug=f'problem-{code}')
+            for code in range(1, 2001)
+        ])
+        Problem.objects.bulk_create([
+            Problem(
+                schedule_id=cls.normal_schedule if code % 2 else cls.free_schedule,
+                catalog_id_id=code,
+                status=ProblemStatusChoices.SP if code % 2 else ProblemStatusChoices.AC,
+                proof_url=None if code % 2 else f'https://leetcode.com/submissions/detail/{code}/',
+                done_date=None if code % 2 else now - timedelta(hours=code),
+            )
+            for code in range(1, 2001)
+        ])
+        ServerOperations.objects.bulk_create([ServerOperations(operation_name='UPDATE_BENCHMARK') for _ in range(100)])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+
+    def tearDown(self):
+        with connection.cursor() as cursor:
+            cursor.execute('RESET enable_seqscan')
+
+    def assertNoSeqScan(self, queryset, table):
+        plan = queryset.explain()
+        self.assertNotIn(f'Seq Scan on {table}', plan, plan)
+
+    def test_proof_url_dedupe(self):
+        proof_urls = [f'https://leetcode.com/submissions/detail/{code}/' for code in range(2, 32, 2)]
+        self.assertNoSeqScan(Problem.objects.filter(proof_url__in=proof_urls).values_list('proof_url', flat=True), 'check_problem')
+
+    def test_catalog_title_match(self):
+        self.assertNoSeqScan(ProblemCatalog.objects.filter(problem_title='Problem 7'), 'check_problemcatalog')
+
+    def test_schedule_problem_by_catalog(self):
+        self.assertNoSeqScan(Problem.objects.filter(schedule_id=self.normal_schedule, catalog_id=7), 'check_problem')
+
+    def test_leaderboard_window(self):
+        self.assertNoSeqScan(
+            Problem.objects.filter(status=ProblemStatusChoices.AC, done_date__gte=timezone.now() - timedelta(days=7)).values('schedule_id'),
+            'check_problem',
+        )
+
+    def test_schedule_type(self):
+        self.assertNoSeqScan(Schedule.objects.filter(schedule_type=ScheduleTypeChoices.NORMAL), 'check_schedule')
+
+    def test_latest_free_schedule(self):
+        self.assertNoSeqScan(
+            Schedule.objects.filter(member_id=self.member, schedule_type=ScheduleTypeChoices.FREE).order_by('-start_date')[:1],
+            'check_schedule',
+        )
+
+    def test_daily_count_window(self):
+        self.assertNoSeqScan(
+            MemberDailyCount.objects.filter(day__gte=timezone.localdate() - timedelta(days=7)).values('member_id', 'count'),
+            'check_memberdailycount',
+        )
+
+    def test_latest_logs(self):
+        self.assertNoSeqScan(ServerOperations.objects.order_by('-timestamp')[:10], 'member_serveroperations')
+
+class ProblemCatalogSyncTests(TestCase):
+    """
+    Sync the problem catalog against the fake leetcode api
+    """
+
+    def setUp(self):
+        self.fake_server = FakeLeetcodeServer().start()
+        self.addCleanup(self.fake_server.stop)
+        self.addCleanup(leetcode_parser.invalidate_problem_catalog_index)
+        self.scraper = LeetcodeScraper('US', base_url=self.fake_server.url, cache=None)
+
+    def test_sync_upserts_only_changed_problems(self):
+        total = len(self.fake_server.problems)
+        result = leetcode_parser.sync_problem_catalog(self.scraper, page_size=500)
+        self.assertEqual(result, {'listed': total, 'created': total, 'updated': 0, 'complete': True})
+
+        result = leetcode_parser.sync_problem_catalog(self.scraper, page_size=500)
+        self.assertEqual(result, {'listed': total, 'created': 0, 'updated': 0, 'complete': True})
+
+        self.fake_server.problems[0] = dict(self.fake_server.problems[0], titleSlug='two-sum-renamed')
+        self.fake_server.problems.append({
+            'acRate': 50.0, 'difficulty': 'Hard', 'frontendQuestionId': '100000', 'paidOnly': False,
+            'title': 'Brand New Problem', 'titleSlug': 'brand-new-problem',
+        })
+        result = leetcode_parser.sync_problem_catalog(self.scraper, page_size=500)
+        self.assertEqual(result, {'listed': total + 1, 'created': 1, 'updated': 1, 'complete': True})
+        self.assertEqual(ProblemCatalog.objects.get(problem_code=1).problem_slug, 'two-sum-renamed')
+        self.assertEqual(leetcode_parser.get_catalog_problem_by_code(100000).difficulty, 'Hard')
+
+    def test_negative_cache_is_bounded(self):
+        leetcode_parser.invalidate_problem_catalog_index()
+        before = leetcode_parser.get_problem_catalog_stats()
+        with mock.patch.object(leetcode_parser, 'PROBLEM_CATALOG_MISS_MAX_ENTRIES', 2), \
+                mock.patch.object(leetcode_parser, 'sync_problem_catalog') as sync_problem_catalog:
+            for problem_code in (900001, 900002, 900003, 900003):
+                self.assertIsNone(leetcode_parser.get_catalog_problem_by_code(problem_code))
+            stats = leetcode_parser.get_problem_catalog_stats()
+            self.assertEqual(stats['negative_entries'], 2)
+            self.assertEqual(stats['negative_evictions'] - before['negative_evictions'], 1)
+            self.assertEqual(stats['negative_hits'] - before['negative_hits'], 1)
+            self.assertLessEqual(sync_problem_catalog.call_count, 1)
+        leetcode_parser.invalidate_problem_catalog_index()
+        self.assertEqual(leetcode_parser.get_problem_catalog_stats()['negative_entries'], 0)
+
+class CatalogMigrationTests(SimpleTestCase):
+
+    def test_csv_details(self):
+        problems = load_problems()
+        migration = importlib.import_module('check.migrations.0011_move_root_problems_to_catalog')
+        csv_details = migration.read_csv_details()
+        self.assertEqual(len(csv_details), len(problems))
+        self.assertEqual(
+            Counter(difficulty for difficulty, _ in csv_details.values()),
+            Counter(problem['difficulty'] for problem in problems),
+        )
+        # a title with a comma, and a row with swapped columns
+        self.assertEqual(csv_details[50], ('Medium', 35.8))
+        self.assertEqual(csv_details[176], ('Medium', 41.9))
+
+class BatchedRecentSubmissionsTests(SimpleTestCase):
+
+    def scraper(self, fake_server):
+        return LeetcodeScraper('US', base_url=fake_server.url, cache=None, max_retries=0, rate_limiter=RateLimiter(rate=1000, burst=100, max_concurrency=1))
+
+    def submission_ids(self, output):
+        return {username: [submission['id'] for submission in result['recentAcSubmissions']['recentAcSubmissionList']] for username, result in output.items()}
+
+    def test_failed_fields_fall_back_to_single_requests(self):
+        class PartlyFailingServer(FakeLeetcodeServer):
+            # the fields of some users fail inside an otherwise answered batch
+            def answer(self, json_data):
+                status, payload = super().answer(json_data)
+                if json_data.get('operationName') == 'recentAcSubmissionsBatch':
+                    for name, username in json_data['variables'].items():
+                        if username in ('user1', 'user3'):
+                            payload['data'][f'user{name[len("username"):]}'] = None
+                    payload['errors'] = [{'message': 'User not found'}]
+                return status, payload
+
+        usernames = [f'user{index}' for index in range(5)]
+        with PartlyFailingServer() as fake_server:
+            output = self.scraper(fake_server).scrape_users_recent_submissions(usernames, batch_size=5)
+            # one batch, then one request per failed field
+            self.assertEqual(fake_server.get_stats()['requests'], 3)
+            expected = {username: [submission['id'] for submission in fake_server.recent_ac_submissions(username, 15)] for username in usernames}
+        self.assertEqual(self.submission_ids(output), expected)
+
+    def test_failed_batch_falls_back_to_single_requests(self):
+        usernames = [f'user{index}' for index in range(4)]
+        with FakeLeetcodeServer(error_rate=1.0) as fake_server:
+            output = self.scraper(fake_server).scrape_users_recent_submissions(usernames, batch_size=2)
+            self.assertEqual(fake_server.get_stats(), {'requests': 6, 'errors': 6, 'throttled': 0})
+        # users still failing alone are left empty, like scrape_user_recent_submissions
+        self.assertEqual(output, {username: {} for username in usernames})
+
+class FakeClock:
+    """
+    Stand-in of the time module of the scraper, sleeping only moves the clock forward
+    """
+
+    def __init__(self, on_sleep=None):
+        self.now = 0.0
+        self.sleeps = []
+        self.on_sleep = on_sleep
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+        if self.on_sleep is not None:
+            self.on_sleep()
+
+class RateLimiterTests(SimpleTestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch('check.leetcode_scraper.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_token_bucket_waits_for_a_refill(self):
+        rate_limiter = RateLimiter(rate=4, burst=2, max_concurrency=8)
+        for _ in range(3):
+            rate_limiter.acquire()
+            rate_limiter.release(success=True)
+        # the burst is spent by the first two, the third waits a quarter second for its token
+        self.assertEqual(self.clock.sleeps, [0.25])
+        self.assertEqual(rate_limiter.get_stats()['throttled'], 1)
+
+    def test_concurrency_halves_on_failure_and_recovers(self):
+        rate_limiter = RateLimiter(rate=1000, burst=1000, max_concurrency=16)
+        self.assertEqual(rate_limiter.get_stats()['concurrency_limit'], 4)
+        for expected in [2, 1, 1]:
+            rate_limiter.acquire()
+            rate_limiter.release(success=False)
+            self.assertEqual(rate_limiter.get_stats()['concurrency_limit'], expected)
+        # additive increase, about one slot per round of successes
+        for expected in [2, 2, 2, 3]:
+            rate_limiter.acquire()
+            rate_limiter.release(success=True)
+            self.assertEqual(rate_limiter.get_stats()['concurrency_limit'], expected)
+        self.assertEqual(rate_limiter.get_stats()['backoffs'], 3)
+
+    def test_throttled_request_waits_retry_after(self):
+        with FakeLeetcodeServer(throttle_rate=1.0, retry_after=2) as fake_server:
+            # the server accepts requests again once the client waited
+            self.clock.on_sleep = lambda: setattr(fake_server, 'throttle_rate', 0.0)
+            rate_limiter = RateLimiter(rate=1000, burst=100, max_concurrency=8)
+            scraper = LeetcodeScraper('US', base_url=fake_server.url, cache=None, rate_limiter=rate_limiter)
+            output = scraper.scrape_user_recent_submissions('user1')
+            self.assertEqual(fake_server.get_stats()['throttled'], 1)
+        self.assertEqual(len(output['recentAcSubmissions']['recentAcSubmissionList']), 15)
+        self.assertEqual(self.clock.sleeps, [2.0])
+        stats = rate_limiter.get_stats()
+        self.assertEqual((stats['retried'], stats['backoffs']), (1, 1))
+        # halved from 2 by the 429, one more slot after the success
+        self.assertEqual(stats['concurrency_limit'], 2)
+
+    def test_gives_up_after_the_retry_limit(self):
+        with FakeLeetcodeServer(throttle_rate=1.0) as fake_server:
+            rate_limiter = RateLimiter(rate=1000, burst=100, max_concurrency=8)
+            scraper = LeetcodeScraper('US', base_url=fake_server.url, cache=None, max_retries=3, backoff_factor=0.5, rate_limiter=rate_limiter)
+            with self.assertRaises(requests.HTTPError):
+                scraper._send({'operationName': 'recentAcSubmissions', 'variables': {'username': 'user1', 'limit': 15}, 'query': ''})
+            self.assertEqual(fake_server.get_stats()['requests'], 4)
+        # exponential backoff without a Retry-After header
+        self.assertEqual(self.clock.sleeps, [0.5, 1.0, 2.0])
+        stats = rate_limiter.get_stats()
+        self.assertEqual((stats['retried'], stats['failed'], stats['backoffs']), (3, 1, 4))
+
+class AsyncLeetcodeScraperTests(SimpleTestCase):
+
+    async def test_thread_pool_is_reused_until_closed(self):
+        with FakeLeetcodeServer() as fake_server:
+            scraper = LeetcodeScraper('US', base_url=fake_server.url, cache=None, rate_limiter=RateLimiter(rate=1000, burst=100, max_concurrency=8))
+            async with AsyncLeetcodeScraper('US', max_concurrency=4, scraper=scraper) as async_scraper:
+                first = await async_scraper.scrape_users_recent_submissions([f'user{index}' for index in range(10)], batch_size=2)
+                executor = async_scraper._executor
+                await async_scraper.scrape_users_profile(['user1', 'user2'])
+                self.assertIs(async_scraper._executor, executor)
+            self.assertEqual(len(first), 10)
+            self.assertIsNone(async_scraper._executor)
+            self.assertTrue(executor._shutdown)
+
+class ResponseCacheTests(SimpleTestCase):
+
+    def test_endpoints_do_not_share_entries(self):
+        cache = ResponseCache(operation_ttls={'questionTitle': 60})
+        cache.set('https://leetcode.com/graphql/', 'questionTitle', {'titleSlug': 'two-sum'}, {'title': 'Two Sum'})
+        self.assertEqual(cache.get('https://leetcode.com/graphql/', 'questionTitle', {'titleSlug': 'two-sum'}), {'title': 'Two Sum'})
+        self.assertIsNone(cache.get('https://leetcode.cn/graphql/', 'questionTitle', {'titleSlug': 'two-sum'}))
+
+    def test_disk_connection_is_opened_per_process(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ResponseCache(operation_ttls={'questionTitle': 60}, disk_path=os.path.join(directory, 'cache.sqlite3'))
+            self.assertIsNone(cache._disk)
+            cache.set('endpoint', 'questionTitle', {}, {'title': 'Two Sum'})
+            parent_disk = cache._disk
+            with mock.patch('check.leetcode_cache.os.getpid', return_value=os.getpid() + 1):
+                cache.entries.clear()
+                self.assertEqual(cache.get('endpoint', 'questionTitle', {}), {'title': 'Two Sum'})
+                self.assertIsNot(cache._disk, parent_disk)
+            cache._disk.close()
+            parent_disk.close()
+
+class GlobalRankingCrawlTests(SimpleTestCase):
+
+    def test_interrupted_crawl_resumes_from_the_checkpoint(self):
+        class InterruptedSink(JsonlRankingSink):
+            def write_page(self, page_num, ranking_nodes):
+                if page_num == 4:
+                    raise KeyboardInterrupt()
+                super().write_page(page_num, ranking_nodes)
+
+        with FakeLeetcodeServer(total_users=95, users_per_page=10) as fake_server, tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'ranking.jsonl')
+            scraper = LeetcodeScraper('US', base_url=fake_server.url, cache=None, rate_limiter=RateLimiter(rate=1000, burst=100, max_concurrency=1))
+            sink = InterruptedSink(output)
+            with self.assertRaises(KeyboardInterrupt):
+                scraper.crawl_global_ranking(sink, f'{output}.checkpoint', window=1)
+            sink.close()
+            with open(f'{output}.checkpoint') as file:
+                self.assertEqual(file.read().split(), ['1', '2', '3'])
+
+            stdout = StringIO()
+            snapshot_path = os.path.join(directory, 'ranking.snapshot')
+            call_command('crawl_global_ranking', '--output', output, '--base-url', fake_server.url, '--snapshot', snapshot_path, stdout=stdout)
+            self.assertIn('3 pages resumed', stdout.getvalue())
+            with open(output, encoding='utf8') as file:
+                usernames = [json.loads(line)['user']['username'] for line in file]
+            # every page is written once, the interrupted one after the restart
+            self.assertEqual(sorted(usernames), sorted(f'user{rank}' for rank in range(1, 96)))
+            with RankingSnapshot(snapshot_path) as snapshot:
+                self.assertEqual(len(snapshot), 95)
+                self.assertEqual(snapshot.top_k(1)[0]['username'], 'user1')
+                self.assertEqual(snapshot.lookup('user42')['ranking'], 42)
+
+class CatalogSnapshotTests(SimpleTestCase):
+
+    def test_lookup_round_trip(self):
+        problems = [
+            {'problem_code': 2, 'problem_title': 'Add Two Numbers', 'problem_slug': 'add-two-numbers', 'difficulty': 'Medium', 'acceptance_rate': 44.4},
+            {'problem_code': 1, 'problem_title': 'Two Sum', 'problem_slug': 'two-sum', 'difficulty': 'Easy', 'acceptance_rate': 54.0},
+            {'problem_code': 3, 'problem_title': 'Two Sum', 'problem_slug': 'two-sum-copy', 'difficulty': None, 'acceptance_rate': None},
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'catalog.snapshot')
+            self.assertEqual(write_catalog_snapshot(problems, path), 3)
+            with CatalogSnapshot(path) as snapshot:
+                self.assertEqual(snapshot.row(snapshot.find_code(2)), problems[0])
+                self.assertEqual(snapshot.row(snapshot.find_code(3)), problems[2])
+                # duplicated titles resolve to the lowest code
+                self.assertEqual(snapshot.row(snapshot.find_title('Two Sum'))['problem_code'], 1)
+                self.assertEqual(snapshot.row(snapshot.find_slug('two-sum-copy'))['problem_code'], 3)
+                self.assertIsNone(snapshot.find_code(4))
+                self.assertIsNone(snapshot.find_title('Missing'))
+
+class RankingSnapshotTests(SimpleTestCase):
+
+    def node(self, username, rating, ranking, data_region='US', country='China'):
+        return {
+            'ranking': ranking, 'currentRating': rating, 'currentGlobalRanking': ranking, 'dataRegion': data_region,
+            'user': {'username': username, 'profile': {'countryName': country}},
+        }
+
+    def test_round_trip(self):
+        nodes = [
+            self.node('bob', 2000.5, 2),
+            self.node('alice', 2500.0, 1, data_region='CN'),
+            self.node('carol', 1500.0, 3, country=None),
+            # a user moving between pages during the crawl is kept once, with its first node
+            self.node('bob', 1000.0, 4),
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'ranking.snapshot')
+            self.assertEqual(write_ranking_snapshot(nodes, path), 3)
+            self.assertEqual(os.listdir(directory), ['ranking.snapshot'])
+            with RankingSnapshot(path) as snapshot:
+                self.assertEqual(len(snapshot), 3)
+                self.assertEqual(snapshot.lookup('alice'), {
+                    'username': 'alice', 'rating': 2500.0, 'ranking': 1, 'global_rank': 1, 'data_region': 'CN', 'country': 'China',
+                })
+                self.assertEqual(snapshot.lookup('bob')['rating'], 2000.5)
+                self.assertEqual(snapshot.lookup('carol')['country'], '')
+                self.assertIsNone(snapshot.lookup('dave'))
+                self.assertEqual([row['username'] for row in snapshot.top_k(5)], ['alice', 'bob', 'carol'])
+                self.assertEqual(snapshot.count_rating_above(2000.5), 1)
+                self.assertAlmostEqual(snapshot.percentile(2000.5), 200 / 3)
+                self.assertEqual(snapshot.percentile(3000.0), 100.0)
+
+class UpdateAcProblemsTests(TestCase):
+    """
+    Record recent ac submissions of a member, without network
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        ProblemCatalog.objects.bulk_create([
+            ProblemCatalog(problem_code=code, problem_title=f'Problem {code}', problem_slug=f'problem-{code}')
+            for code in range(1, 4)
+        ])
+        cls.member = Member.objects.create(user_id=User.objects.create_user(username='member'), leetcode_username='member')
+
+    def setUp(self):
+        leetcode_parser.invalidate_problem_catalog_index()
+        self.addCleanup(leetcode_parser.invalidate_problem_catalog_index)
+        # catalog misses must not reach leetcode
+        patcher = mock.patch.object(leetcode_parser, 'sync_problem_catalog')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def submissions(self, *submissions):
+        return {'recentAcSubmissions': {'recentAcSubmissionList': [
+            {'id': str(submission_id), 'title': title, 'titleSlug': slugify(title), 'timestamp': str(1700000000 + submission_id)}
+            for submission_id, title in submissions
+        ]}}
+
+    def test_unresolved_submission_is_retried(self):
+        recent = self.submissions((30, 'Problem 3'), (20, 'Brand New Problem'), (10, 'Problem 1'))
+        leetcode_parser.update_ac_problems(self.member, recent)
+        self.member.refresh_from_db()
+        # the watermark stays below the submission of the unknown problem
+        self.assertEqual(self.member.last_submission_id, 10)
+        self.assertEqual(Problem.objects.filter(schedule_id__member_id=self.member).count(), 2)
+
+        ProblemCatalog.objects.create(problem_code=4, problem_title='Brand New Problem', problem_slug='brand-new-problem')
+        leetcode_parser.invalidate_problem_catalog_index()
+        leetcode_parser.update_ac_problems(self.member, recent)
+        self.member.refresh_from_db()
+        self.assertEqual(self.member.last_submission_id, 30)
+        self.assertEqual(self.member.last_submission_timestamp, datetime.fromtimestamp(1700000030, tz=dt_timezone.utc))
+        self.assertEqual(
+            sorted(Problem.objects.filter(schedule_id__member_id=self.member).values_list('catalog_id', flat=True)),
+            [1, 3, 4],
+        )
+
+    def test_submissions_go_to_normal_then_free_schedules(self):
+        normal_schedule = Schedule.objects.create(member_id=self.member, schedule_type=ScheduleTypeChoices.NORMAL, goals=1)
+        open_problem = Problem.objects.create(schedule_id=normal_schedule, catalog_id_id=1)
+        leetcode_parser.update_ac_problems(self.member, self.submissions((10, 'Problem 1'), (11, 'Problem 2')))
+        open_problem.refresh_from_db()
+        self.assertEqual(open_problem.status, ProblemStatusChoices.AC)
+        self.assertEqual(open_problem.proof_url, 'https://leetcode.com/submissions/detail/10/')
+        self.assertEqual(open_problem.done_date, datetime.fromtimestamp(1700000010, tz=dt_timezone.utc))
+        # the member had no free schedule, one is created for the problem outside the normal schedule
+        free_problem = Problem.objects.get(schedule_id__member_id=self.member, schedule_id__schedule_type=ScheduleTypeChoices.FREE)
+        self.assertEqual((free_problem.catalog_id_id, free_problem.status), (2, ProblemStatusChoices.AC))
+
+    def test_rerun_does_not_duplicate_problems(self):
+        recent = self.submissions((10, 'Problem 1'), (11, 'Problem 2'))
+        leetcode_parser.update_ac_problems(self.member, recent)
+        # without the watermark the submissions are matched again by their proof url
+        Member.objects.filter(id=self.member.id).update(last_submission_id=None, last_submission_timestamp=None)
+        self.member.refresh_from_db()
+        leetcode_parser.update_ac_problems(self.member, recent)
+        self.assertEqual(Problem.objects.filter(schedule_id__member_id=self.member).count(), 2)
+        self.assertEqual(Schedule.objects.filter(member_id=self.member).count(), 1)
+
+    def test_submissions_below_the_watermark_are_skipped(self):
+        leetcode_parser.update_ac_problems(self.member, self.submissions((10, 'Problem 1')))
+        with self.assertNumQueries(0):
+            leetcode_parser.update_ac_problems(self.member, self.submissions((10, 'Problem 1'), (9, 'Problem 2')))
+
+class MemberStatsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        ProblemCatalog.objects.bulk_create([
+            ProblemCatalog(problem_code=code, problem_title=f'Problem {code}', problem_slug=f'problem-{code}')
+            for code in range(1, 11)
+        ])
+        now = timezone.now()
+        for index in range(3):
+            member = Member.objects.create(user_id=User.objects.create_user(username=f'member{index}'), leetcode_username=f'member{index}')
+            schedule = Schedule.objects.create(member_id=member, schedule_type=ScheduleTypeChoices.FREE, goals=65535)
+            Problem.objects.bulk_create([
+                Problem(schedule_id=schedule, catalog_id_id=code, status=ProblemStatusChoices.AC, done_date=now - timedelta(days=code * index))
+                for code in range(1, 11)
+            ])
+
+    def ranked(self, leaderboards):
+        return {name: [(entry['user'].id, entry['AC_count'], entry['last_submission_time']) for entry in ranking] for name, ranking in leaderboards.items()}
+
+    def test_stats_match_the_problems(self):
+        self.assertEqual(self.ranked(get_stats_leaderboards()), self.ranked(get_leaderboards()))
+        self.assertEqual(rebuild_member_stats()['drifted'], 0)
+
+    def test_reconcile_reports_drift(self):
+        rebuild_member_stats()
+        MemberStats.objects.filter(member_id__leetcode_username='member1').update(all_time_count=99)
+        result = rebuild_member_stats()
+        self.assertEqual(result['drifted'], 1)
+        self.assertEqual(result['drift'], {'all_time_count': 1})
+        self.assertEqual(MemberStats.objects.get(member_id__leetcode_username='member1').all_time_count, 10)
+
+    def test_recorded_problems_update_the_daily_counts(self):
+        rebuild_member_stats()
+        member = Member.objects.get(leetcode_username='member0')
+        now = timezone.now()
+        Problem.objects.create(schedule_id=Schedule.objects.get(member_id=member), catalog_id_id=1, status=ProblemStatusChoices.AC, done_date=now)
+        record_ac_problems(member, [now])
+        self.assertEqual(MemberDailyCount.objects.get(member_id=member, day=timezone.localdate(now)).count, 11)
+        self.assertEqual(rebuild_member_stats()['drifted'], 0)
+
+    def test_recording_costs_the_same_queries_for_any_number_of_days(self):
+        # a member with a stats row but no problems yet, so every record is counted incrementally
+        member = Member.objects.create(user_id=User.objects.create_user(username='member3'), leetcode_username='member3')
+        rebuild_member_stats()
+        now = timezone.now()
+        queries = []
+        for days in (30, 1):
+            done_dates = [now - timedelta(days=day) for day in range(days)]
+            with CaptureQueriesContext(connection) as captured:
+                record_ac_problems(member, done_dates)
+            queries.append(len(captured))
+        self.assertEqual(queries[0], queries[1])
+        self.assertEqual(MemberDailyCount.objects.filter(member_id=member).count(), 30)
+        self.assertEqual(MemberDailyCount.objects.get(member_id=member, day=timezone.localdate(now)).count, 2)
+
+    def test_stale_stats_roll_over_from_the_daily_counts(self):
+        rebuild_member_stats()
+        MemberStats.objects.update(computed_for=timezone.localdate() - timedelta(days=1), daily_count=99, weekly_count=99)
+        self.assertEqual(self.ranked(get_stats_leaderboards()), self.ranked(get_leaderboards()))
+
+    def test_partly_filled_stats_are_completed(self):
+        # the first update after a deploy creates the row of one member only
+        member = Member.objects.get(leetcode_username='member0')
+        now = timezone.now()
+        Problem.objects.create(schedule_id=Schedule.objects.get(member_id=member), catalog_id_id=1, status=ProblemStatusChoices.AC, done_date=now)
+        record_ac_problems(member, [now])
+        self.assertEqual(MemberStats.objects.count(), 1)
+        self.assertEqual(self.ranked(get_stats_leaderboards()), self.ranked(get_leaderboards()))
+        self.assertEqual(MemberStats.objects.count(), 3)
+        self.assertEqual(rebuild_member_stats()['drifted'], 0)
+
+    def test_migration_fills_the_stats(self):
+        migration = importlib.import_module('check.migrations.0014_memberstats')
+        migration.count_member_stats(apps, None)
+        self.assertEqual(MemberStats.objects.count(), 3)
+        # only the daily counts, filled by the next migration, are missing
+        self.assertEqual(list(rebuild_member_stats()['drift']), ['daily_counts'])
+
+    def test_days_window_matches_the_named_windows(self):
+        for window, days in [('daily', 1), ('weekly', 7), ('all_time', 3650)]:
+            pages = [[], []]
+            afters = [None, None]
+            while True:
+                for index, page in enumerate([get_leaderboard_page(window, after=afters[0], limit=2), get_days_leaderboard_page(days, after=afters[1], limit=2)]):
+                    entries, afters[index] = page
+                    pages[index].extend((entry['rank'], entry['user'].id, entry['AC_count']) for entry in entries)
+                if afters[0] is None:
+                    break
+            self.assertEqual(pages[0], pages[1], window)
+            self.assertIsNone(afters[1])
+
+    def test_days_window_without_stats_rows(self):
+        rebuild_member_stats()
+        MemberStats.objects.all().delete()
+        entries, after = get_days_leaderboard_page(3650)
+        self.assertIsNone(after)
+        self.assertEqual([entry['AC_count'] for entry in entries], [10, 10, 10])
+        self.assertEqual([entry['last_submission_time'] for entry in entries], [entry['user'].date_joined for entry in entries])
+
+class LeaderboardViewTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        ProblemCatalog.objects.bulk_create([
+            ProblemCatalog(problem_code=code, problem_title=f'Problem {code}', problem_slug=f'problem-{code}', difficulty='Easy' if code % 2 else 'Hard')
+            for code in range(1, 6)
+        ])
+        now = timezone.now()
+        for index in range(5):
+            member = Member.objects.create(user_id=User.objects.create_user(username=f'member{index}'), leetcode_username=f'leetcode{index}')
+            schedule = Schedule.objects.create(member_id=member, schedule_type=ScheduleTypeChoices.FREE, goals=65535)
+            # member4 did the most problems, member1 to member3 did theirs ten days ago
+            Problem.objects.bulk_create([
+                Problem(schedule_id=schedule, catalog_id_id=code, status=ProblemStatusChoices.AC, done_date=now - timedelta(days=0 if index in (0, 4) else 10))
+                for code in range(1, index + 2)
+            ])
+
+    def test_first_response_revalidates(self):
+        # no stats rows yet, building them while serving bumps the version
+        for url in [reverse('check:benchmark'), reverse('check:leaderboard', args=['all_time'])]:
+            bump_leaderboard_version()
+            MemberStats.objects.all().delete()
+            first = self.client.get(url)
+            self.assertEqual(first.status_code, 200, url)
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304, url)
+
+    def test_recorded_problems_change_the_etag(self):
+        url = reverse('check:leaderboard', args=['daily'])
+        first = self.client.get(url)
+        member = Member.objects.get(leetcode_username='leetcode1')
+        now = timezone.now()
+        Problem.objects.create(schedule_id=Schedule.objects.get(member_id=member), catalog_id_id=5, status=ProblemStatusChoices.AC, done_date=now)
+        record_ac_problems(member, [now])
+        bump_leaderboard_version()
+        second = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second['ETag'], first['ETag'])
+        self.assertIn('leetcode1', [entry['leetcode_username'] for entry in second.json()['results']])
+
+    def pages(self, window, **params):
+        results, cursor = [], None
+        while True:
+            response = self.client.get(reverse('check:leaderboard', args=[window]), dict(params, **({'cursor': cursor} if cursor else {})))
+            self.assertEqual(response.status_code, 200)
+            results.extend(response.json()['results'])
+            cursor = response.json()['next_cursor']
+            if cursor is None:
+                return results
+
+    def test_cursor_pages_cover_the_ranking(self):
+        results = self.pages('all_time', limit=2, fields='rank,leetcode_username,ac_count')
+        self.assertEqual(results, [
+            {'rank': rank, 'leetcode_username': f'leetcode{index}', 'ac_count': index + 1}
+            for rank, index in enumerate([4, 3, 2, 1, 0], start=1)
+        ])
+        self.assertEqual([entry['leetcode_username'] for entry in self.pages('daily', limit=1)], ['leetcode4', 'leetcode0'])
+        self.assertEqual(set(self.pages('daily')[0]), {'rank', 'username', 'leetcode_username', 'ac_count', 'last_submission_time'})
+
+    def test_days_windows(self):
+        self.assertEqual(self.pages('30d', limit=2), self.pages('all_time', limit=3))
+        self.assertEqual([entry['leetcode_username'] for entry in self.pages('7d', fields='leetcode_username')], ['leetcode4', 'leetcode0'])
+
+    def test_difficulty(self):
+        results = self.pages('all_time', difficulty='Hard', fields='leetcode_username,ac_count')
+        # codes 2 and 4 are hard
+        self.assertEqual(results, [
+            {'leetcode_username': 'leetcode3', 'ac_count': 2}, {'leetcode_username': 'leetcode4', 'ac_count': 2},
+            {'leetcode_username': 'leetcode1', 'ac_count': 1}, {'leetcode_username': 'leetcode2', 'ac_count': 1},
+        ])
+
+    def test_invalid_requests(self):
+        url = reverse('check:leaderboard', args=['all_time'])
+        for params in [
+            {'cursor': 'not a cursor'},
+            {'cursor': base64.urlsafe_b64encode(b'[1, 2]').decode('ascii')},
+            {'limit': 0},
+            {'limit': 'many'},
+            {'fields': 'rank,password'},
+            {'difficulty': 'Impossible'},
+        ]:
+            self.assertEqual(self.client.get(url, params).status_code, 400, params)
+        self.assertEqual(self.client.get(reverse('check:leaderboard', args=['7d']), {'difficulty': 'Easy'}).status_code, 400)
+        for window in ['monthly', '0d', '366d']:
+            self.assertEqual(self.client.get(reverse('check:leaderboard', args=[window])).status_code, 404, window)
+
+class LeaderboardStreamTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        ProblemCatalog.objects.bulk_create([
+            ProblemCatalog(problem_code=code, problem_title=f'Problem {code}', problem_slug=f'problem-{code}')
+            for code in range(1, 4)
+        ])
+        cls.schedules = []
+        for index in range(2):
+            member = Member.objects.create(user_id=User.objects.create_user(username=f'member{index}'), leetcode_username=f'member{index}')
+            cls.schedules.append(Schedule.objects.create(member_id=member, schedule_type=ScheduleTypeChoices.FREE, goals=65535))
+        Problem.objects.create(schedule_id=cls.schedules[0], catalog_id_id=1, status=ProblemStatusChoices.AC, done_date=timezone.now())
+
+    def parse(self, frame):
+        fields = dict(line.split(': ', 1) for line in frame.decode('utf8').strip().split('\n'))
+        return fields['event'], json.loads(fields['data'])
+
+    def add_ac_problems(self, schedule, codes):
+        now = timezone.now()
+        Problem.objects.bulk_create([
+            Problem(schedule_id=schedule, catalog_id_id=code, status=ProblemStatusChoices.AC, done_date=now) for code in codes
+        ])
+        record_ac_problems(schedule.member_id, [now] * len(codes))
+        bump_leaderboard_version()
+
+    async def test_snapshot_then_delta(self):
+        hub = LeaderboardHub(poll_interval=3600)
+        first, second = await hub.subscribe(), await hub.subscribe()
+        event, snapshot = self.parse(first.get_nowait())
+        self.assertEqual(event, 'snapshot')
+        self.assertEqual([entry['username'] for entry in snapshot['all_time']], ['member0'])
+        second.get_nowait()
+
+        # unchanged version, nothing is ranked or sent
+        self.assertFalse(await hub.refresh())
+        await sync_to_async(self.add_ac_problems)(self.schedules[1], [1, 2])
+        self.assertTrue(await hub.refresh())
+        frame = first.get_nowait()
+        # serialized once for every subscriber
+        self.assertIs(second.get_nowait(), frame)
+        event, delta = self.parse(frame)
+        self.assertEqual(event, 'delta')
+        self.assertEqual(
+            [(entry['username'], entry['rank'], entry['ac_count']) for entry in delta['all_time']['changed']],
+            [('member1', 1, 2), ('member0', 2, 1)],
+        )
+        self.assertEqual(delta['all_time']['removed'], [])
+        hub.unsubscribe(first)
+        hub.unsubscribe(second)
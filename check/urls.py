@@ -10,4 +10,7 @@ urlpatterns = [
     path('', views.get_benchmark, name='benchmark'),
     path('get_ac_data', views.get_ac_data, name='get_ac_data'),
     path('get_schedule_data', views.get_schedule_data, name='get_schedule_data'),
+    path('sync_jobs/<int:job_id>', views.get_sync_job, name='sync_job'),
+    path('api/leaderboard/stream', views.get_leaderboard_stream, name='leaderboard_stream'),
+    path('api/leaderboard/<str:window>', views.get_leaderboard, name='leaderboard'),
 ]
\ No newline at end of file
@@ -1,17 +1,23 @@
-from datetime import timedelta
-from django.http import JsonResponse
-from django.utils import timezone
+import asyncio
+import base64
+from datetime import datetime, timezone as dt_timezone
+import hashlib
+import json
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
-from django.db.models import Q
-from django.views.decorators.http import require_POST, require_GET
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_POST, require_GET
 
-# import scraper
-from member.googlesheet_scraper import GoogleSheetScraper
-from member.googlesheet_parser import update_member_data, update_benchmark
+# import sync jobs
+from member.sync_jobs import start_sync_job, sync_job_status
+from check.leaderboard_stream import leaderboard_hub
+from check.leaderboard import LEADERBOARD_WINDOWS, get_days_leaderboard_page, get_leaderboard_page, get_leaderboard_version, get_leaderboards, get_stats_leaderboards, refresh_member_stats, window_start
 
 # import models
-from check.models import Problem, ProblemStatusChoices, Schedule
-from member.models import Member, ServerOperations
+from check.models import ProblemDifficultyChoices
+from member.models import ServerOperationChoices, ServerOperations, SyncJob
 
 # import logger
 import logging
@@ -25,80 +31,191 @@ from dotenv import load_dotenv
 BASE_DIR = Path(__file__).resolve().parent.parent
 load_dotenv(os.path.join(BASE_DIR,'.env'))
 
-# utils functions:
-
-def last_submission_time(member_id):
-    # get all schedule id of this member
-    schedule_ids = Schedule.objects.filter(member_id=member_id).values_list('id', flat=True)
-    if schedule_ids.count() == 0:
-        return member_id.date_joined
-    # get all problem of this schedule id
-    problems = Problem.objects.filter(Q(schedule_id__in=schedule_ids) & Q(status=ProblemStatusChoices.AC)).order_by('-done_date').first()
-    if problems is None:
-        return member_id.date_joined
-    return problems.done_date
-
-
 # Create your views here.
 
+def __sync_job_response(job, created, name):
+    # the update runs in celery, poll the job with get_sync_job
+    message = f'{name} update queued' if created else f'{name} update already in flight'
+    return JsonResponse({'message': message, **sync_job_status(job)}, status=202)
+
 @require_GET
 def get_ac_data(request):
-    update_benchmark()
-    return JsonResponse({'message': 'AC data correctly updated'})
+    job, created = start_sync_job(ServerOperationChoices.UPDATE_BENCHMARK)
+    return __sync_job_response(job, created, 'AC data')
 
 @require_GET
 def get_schedule_data(request):
-    update_member_data(GoogleSheetScraper(os.getenv("GOOGLE_SHEET_ID"), os.getenv("GOOGLE_API_KEY")))
-    return JsonResponse({'message': 'Schedule data correctly updated'})
+    job, created = start_sync_job(ServerOperationChoices.UPDATE_MEMBER)
+    return __sync_job_response(job, created, 'Schedule data')
+
+@require_GET
+def get_sync_job(request, job_id):
+    job = SyncJob.objects.filter(id=job_id).first()
+    if job is None:
+        return JsonResponse({'message': f'Unknown sync job {job_id}'}, status=404)
+    return JsonResponse(sync_job_status(job))
 
 
+# seconds a rendered benchmark page is kept, pages are keyed by version so they are never served stale
+BENCHMARK_PAGE_CACHE_TIMEOUT = 300
+
+def __benchmark_difficulty(request):
+    # optionally rank by the problems of one difficulty only, joined from the problem catalog
+    difficulty = request.GET.get('difficulty')
+    return difficulty if difficulty in ProblemDifficultyChoices.values else None
+
+def __leaderboard_version(request):
+    # refreshing the stats may bump the version, read it once per request after the refresh
+    if not hasattr(request, 'leaderboard_version'):
+        refresh_member_stats()
+        request.leaderboard_version = get_leaderboard_version()
+    return request.leaderboard_version
+
+def __benchmark_etag(request):
+    # the windows move at local midnight even without writes
+    return f"{__leaderboard_version(request):.6f}-{timezone.localdate()}-{__benchmark_difficulty(request) or 'all'}"
+
+def __benchmark_last_modified(request):
+    last_write = datetime.fromtimestamp(__leaderboard_version(request), tz=dt_timezone.utc)
+    return max(last_write, window_start(0))
+
 @require_GET
+@condition(etag_func=__benchmark_etag, last_modified_func=__benchmark_last_modified)
 def get_benchmark(request):
     # update_member_data(GoogleSheetScraper(os.getenv("GOOGLE_SHEET_ID"), os.getenv("GOOGLE_API_KEY")))
     # update_benchmark()
-    context={'last_update_time': 'N/A'}
-    # test data
-    daily_submissions = Problem.objects.filter(
-        Q(schedule_id__member_id__user_id__is_staff=False)&
-        Q(status=ProblemStatusChoices.AC)&
-        Q(done_date__date__gte=timezone.now().date()-timedelta(days=1))
-        )
-    daily_users = daily_submissions.values('schedule_id__member_id').distinct()
-    daily_ranking = sorted([{
-        "user": Member.objects.get(id=problem['schedule_id__member_id']), 
-        "AC_count": daily_submissions.filter(schedule_id__member_id=problem['schedule_id__member_id']).count(), 
-        "last_submission_time": last_submission_time(problem['schedule_id__member_id'])
-        } for problem in daily_users], key=lambda x: x['AC_count'], reverse=True)
-    
-    logger.info(f"Daily ranking: {daily_ranking}, extracting from: {daily_users}, recent submission: {daily_submissions}")
-
-    weekly_submissions = Problem.objects.filter(
-        Q(schedule_id__member_id__user_id__is_staff=False)&
-        Q(status=ProblemStatusChoices.AC)&
-        Q(done_date__date__gte=timezone.now().date()-timedelta(days=7))
-        )
-    weekly_users = weekly_submissions.values('schedule_id__member_id').distinct()
-    weekly_ranking = sorted([{
-        "user": Member.objects.get(id=problem['schedule_id__member_id']), 
-        "AC_count": weekly_submissions.filter(schedule_id__member_id=problem['schedule_id__member_id']).count(), 
-        "last_submission_time": last_submission_time(problem['schedule_id__member_id'])
-        } for problem in weekly_users], key=lambda x: x['AC_count'], reverse=True)
-    logger.info(f"Weekly ranking: {weekly_ranking}, extracting from: {weekly_users}, recent submission: {weekly_submissions}")
-
-    all_time_submissions = Problem.objects.filter(
-        Q(schedule_id__member_id__user_id__is_staff=False)&
-        Q(status=ProblemStatusChoices.AC)
-        )
-    all_time_users = all_time_submissions.values('schedule_id__member_id').distinct()
-    all_time_ranking = sorted([{
-        "user": Member.objects.get(id=problem['schedule_id__member_id']), 
-        "AC_count": all_time_submissions.filter(schedule_id__member_id=problem['schedule_id__member_id']).count(), 
-        "last_submission_time": last_submission_time(problem['schedule_id__member_id'])
-        } for problem in all_time_users], key=lambda x: x['AC_count'], reverse=True)
-    logger.info(f"All time ranking: {all_time_ranking}, extracting from: {all_time_users}, recent submission: {all_time_submissions}")
-
-    context['daily_benchmark'] = daily_ranking
-    context['weekly_benchmark'] = weekly_ranking
-    context['all_time_benchmark'] = all_time_ranking
-    context['logs'] = ServerOperations.objects.all().order_by('-timestamp')[:10]
-    return render(request,'benchmark_display.html',context)
\ No newline at end of file
+    # pages are cached by data version, a write to the ranked data makes a new key
+    cache_key = f'check:benchmark_page:{__benchmark_etag(request)}'
+    content = cache.get(cache_key)
+    if content is not None:
+        response = HttpResponse(content)
+    else:
+        context={'last_update_time': 'N/A'}
+        context['difficulty'] = __benchmark_difficulty(request)
+        # the stats are counted over all difficulties, rank one difficulty from the problems
+        leaderboards = get_leaderboards(context['difficulty']) if context['difficulty'] else get_stats_leaderboards()
+        context['daily_benchmark'] = leaderboards['daily']
+        context['weekly_benchmark'] = leaderboards['weekly']
+        context['all_time_benchmark'] = leaderboards['all_time']
+        context['logs'] = ServerOperations.objects.all().order_by('-timestamp')[:10]
+        response = render(request,'benchmark_display.html',context)
+        cache.set(cache_key, response.content, BENCHMARK_PAGE_CACHE_TIMEOUT)
+    # let browsers and proxies keep the page, but revalidate it with the etag on every use
+    patch_cache_control(response, no_cache=True)
+    return response
+
+# fields of the entries of the leaderboard api
+LEADERBOARD_API_FIELDS = {
+    'rank': lambda entry: entry['rank'],
+    'username': lambda entry: entry['user'].user_id.username,
+    'leetcode_username': lambda entry: entry['user'].leetcode_username,
+    'ac_count': lambda entry: entry['AC_count'],
+    'last_submission_time': lambda entry: entry['last_submission_time'].isoformat(),
+}
+LEADERBOARD_API_DEFAULT_LIMIT = 50
+LEADERBOARD_API_MAX_LIMIT = 200
+# longest window of days summed from the daily counts
+LEADERBOARD_API_MAX_DAYS = 365
+
+def __encode_cursor(after):
+    return base64.urlsafe_b64encode(json.dumps(after).encode('utf8')).decode('ascii')
+
+def __decode_cursor(cursor):
+    after = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    if not isinstance(after, list) or len(after) != 3 or not all(isinstance(value, int) for value in after):
+        raise ValueError(f'Invalid cursor: {cursor}')
+    return tuple(after)
+
+def __leaderboard_days(window):
+    # days of an Nd window, None for other windows
+    if window.endswith('d') and window[:-1].isdigit() and 1 <= int(window[:-1]) <= LEADERBOARD_API_MAX_DAYS:
+        return int(window[:-1])
+    return None
+
+def __leaderboard_etag(request, window):
+    # one etag per data version, local date and query, the query is hashed to keep the header short
+    query = hashlib.sha1(request.GET.urlencode().encode('utf8')).hexdigest()[:16]
+    return f"{__leaderboard_version(request):.6f}-{timezone.localdate()}-{window}-{query}"
+
+@require_GET
+@condition(etag_func=__leaderboard_etag)
+def get_leaderboard(request, window):
+    """
+    One page of a ranking window as json
+
+    the window is one of LEADERBOARD_WINDOWS, or Nd for the last N days summed from the daily counts
+
+    query parameters: limit, cursor (next_cursor of the previous page), fields (comma separated) and difficulty
+    """
+    days = __leaderboard_days(window)
+    if window not in LEADERBOARD_WINDOWS and days is None:
+        return JsonResponse({'message': f'Unknown window {window}, expected one of {", ".join(LEADERBOARD_WINDOWS)} or 1d to {LEADERBOARD_API_MAX_DAYS}d'}, status=404)
+    try:
+        limit = int(request.GET.get('limit', LEADERBOARD_API_DEFAULT_LIMIT))
+        after = __decode_cursor(request.GET['cursor']) if request.GET.get('cursor') else None
+    except ValueError as e:
+        return JsonResponse({'message': f'Invalid limit or cursor: {e}'}, status=400)
+    if not 1 <= limit <= LEADERBOARD_API_MAX_LIMIT:
+        return JsonResponse({'message': f'limit must be between 1 and {LEADERBOARD_API_MAX_LIMIT}'}, status=400)
+    fields = request.GET.get('fields', '').split(',') if request.GET.get('fields') else list(LEADERBOARD_API_FIELDS)
+    unknown_fields = [field for field in fields if field not in LEADERBOARD_API_FIELDS]
+    if unknown_fields:
+        return JsonResponse({'message': f'Unknown fields {", ".join(unknown_fields)}, expected any of {", ".join(LEADERBOARD_API_FIELDS)}'}, status=400)
+    difficulty = request.GET.get('difficulty')
+    if difficulty is not None and difficulty not in ProblemDifficultyChoices.values:
+        return JsonResponse({'message': f'Unknown difficulty {difficulty}'}, status=400)
+    if difficulty is not None and days is not None:
+        return JsonResponse({'message': 'The daily counts are not split by difficulty, use a named window'}, status=400)
+
+    cache_key = f'check:leaderboard_page:{__leaderboard_etag(request, window)}'
+    payload = cache.get(cache_key)
+    if payload is None:
+        if days is not None:
+            entries, next_after = get_days_leaderboard_page(days, after, limit)
+        else:
+            entries, next_after = get_leaderboard_page(window, difficulty, after, limit)
+        payload = {
+            'window': window,
+            'difficulty': difficulty,
+            'results': [{field: LEADERBOARD_API_FIELDS[field](entry) for field in fields} for entry in entries],
+            'next_cursor': __encode_cursor(next_after) if next_after else None,
+        }
+        cache.set(cache_key, payload, BENCHMARK_PAGE_CACHE_TIMEOUT)
+    response = JsonResponse(payload)
+    patch_cache_control(response, no_cache=True)
+    return response
+
+# seconds between keepalive comments, so idle connections are not closed by proxies
+LEADERBOARD_STREAM_KEEPALIVE = 15
+# seconds a stream is served before the browser is made to reconnect, bounds subscribers of vanished clients
+LEADERBOARD_STREAM_MAX_AGE = 600
+# milliseconds browsers wait before reconnecting
+LEADERBOARD_STREAM_RETRY = 3000
+
+async def __leaderboard_events(queue):
+    try:
+        yield f"retry: {LEADERBOARD_STREAM_RETRY}\n\n".encode('utf8')
+        deadline = asyncio.get_running_loop().time() + LEADERBOARD_STREAM_MAX_AGE
+        while asyncio.get_running_loop().time() < deadline:
+            try:
+                yield await asyncio.wait_for(queue.get(), LEADERBOARD_STREAM_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+    finally:
+        leaderboard_hub.unsubscribe(queue)
+
+async def get_leaderboard_stream(request):
+    """
+    Server-sent events of the rankings of all difficulties, served by the ASGI entry point
+
+    a snapshot event with every window is sent first, then delta events with the changed entries and removed member ids
+    """
+    # the http method decorators of django 4.2 do not wrap async views
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    queue = await leaderboard_hub.subscribe()
+    response = StreamingHttpResponse(__leaderboard_events(queue), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # nginx must pass the events on as they come
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,6 +1,7 @@
 from django.contrib import admin
-from .models import Member, ServerOperations
+from .models import Member, ServerOperations, SyncJob
 # Register your models here.
 
 admin.site.register(Member)
 admin.site.register(ServerOperations)
+admin.site.register(SyncJob)
@@ -7,21 +7,42 @@ And interaction with google sheet API
 """
 
 # import models
-from datetime import datetime
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import time
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.db.models import Max, Q
 from member.models import Member, LeetCodeSeverChoices
 from check.models import ProblemStatusChoices, Schedule, Problem, ScheduleTypeChoices
-from check.leetcode_parser import get_root_problem_by_code, update_ac_problems
+from check.leaderboard import bump_leaderboard_version
+from check.leetcode_parser import get_catalog_problem_by_code, get_problem_catalog_stats, scrape_members_recent_submissions, update_ac_problems
 from member.googlesheet_scraper import GoogleSheetScraper
 from django.contrib.auth.models import User
 
 # typing
-from typing import Optional
+from typing import Callable, Optional
 
 # import utils
 import logging
 
 logger = logging.getLogger(__name__)
 
+# polling interval of a member by the time since its last ac submission
+POLL_INTERVALS = [
+    (timedelta(days=1), timedelta(minutes=10)),
+    (timedelta(days=7), timedelta(hours=1)),
+    (timedelta(days=30), timedelta(hours=6)),
+]
+# polling interval of members inactive for longer than all the above
+DORMANT_POLL_INTERVAL = timedelta(days=1)
+# held by the run updating the ac problems of members, two runs would record the same submissions twice
+BENCHMARK_UPDATE_LOCK_CACHE_KEY = 'member:benchmark_update_lock'
+# seconds update_benchmark waits for a running update to finish
+BENCHMARK_UPDATE_LOCK_WAIT = 60
+
 def google_time_to_datetime(google_time: str)->datetime:
     return datetime.strptime(google_time, "%m/%d/%Y %H:%M:%S")
 
@@ -151,79 +172,191 @@ def get_schedule_data(
                 )
                 continue
             # capture problem
-            problem = get_root_problem_by_code(problem_code)
+            problem = get_catalog_problem_by_code(problem_code)
             if problem is None:
                 logger.error(f"Problem {problem_code} not found, when parsing scheduled problems for member {member.user_id.username}")
                 continue
             # create a new problem for this schedule
             Problem.objects.create(
                 schedule_id=new_schedule,
-                problem_code=problem_code,
-                problem_title=problem.problem_title,
-                problem_slug=problem.problem_slug,
+                catalog_id=problem,
                 status=ProblemStatusChoices.NA,
                 proof_url=None,
             )
     return new_schedule
 
-def __create_root_user()->None:
-    root_user = User.objects.filter(username='root').first()
-    if root_user is None:
-        root_user = User.objects.create_user(username='root', email='root@root.com', password=None,is_staff=True)
-    root_member = Member.objects.filter(user_id=root_user).first()
-    if root_member is None:
-        root_member = Member.objects.create(
-            user_id=root_user,
-            leetcode_username='root',
-            server_region=LeetCodeSeverChoices.US,
-            is_leetcode_username_public=False,
-            date_joined=datetime.now(),
-            last_login=datetime.now()
-        )
-
-def update_member_data(google_sheet_scraper: GoogleSheetScraper)->None:
+def update_member_data(google_sheet_scraper: GoogleSheetScraper, progress: Optional[Callable] = None)->None:
     """
     Update the member data
 
+    a sheet row that fails is logged and skipped, the other rows are still updated
+
     :param google_sheet_scraper: google sheet scraper
     :type google_sheet_scraper: GoogleSheetScraper
+    :param progress: called with (rows processed, total rows, error message or None) after each sheet row
+    :type progress: Callable or None
     """
-    # create root user if not exists (guarantee the root user exists)
-    __create_root_user()
     # get the google sheet data
     google_sheet_data = google_sheet_scraper.get_google_sheet_data()
     # skip the first row header
-    for sheet_row, row in enumerate(google_sheet_data["values"][1:]):
-        # read the row data
-        register_date = row[0]
-        leetcode_username = row[1]
-        server_region = row[2]
-        problems_per_week = row[3]
-        start_date = row[4]
-        expire_date = row[5]
-        scheduled_problems = row[6].split()
-        email = row[7]
-        mode = row[8]
-        display_name = row[9] if len(row) > 9 else leetcode_username
-        # check if the member is already in the database
-        member = get_member_data(email, leetcode_username, display_name, register_date, server_region, False)
-        # if member is not valid, skip this member
-        if member is None:
+    rows = google_sheet_data["values"][1:]
+    for sheet_row, row in enumerate(rows):
+        try:
+            __update_member_row(sheet_row, row)
+        except Exception as e:
+            logger.exception(f"Failed to update sheet row {sheet_row}")
+            if progress is not None:
+                progress(sheet_row + 1, len(rows), f"sheet row {sheet_row}: {e}")
             continue
-        get_schedule_data(
-            member,
-            sheet_row,
-            problems_per_week,
-            start_date,
-            expire_date,
-            mode,
-            scheduled_problems,
-        )
-        # update the member data
+        if progress is not None:
+            progress(sheet_row + 1, len(rows), None)
+    # members and schedules shown on the benchmark page may have changed
+    bump_leaderboard_version()
+
+def __update_member_row(sheet_row: int, row: list)->None:
+    """
+    Update the member and schedule of one google sheet row
+
+    :param sheet_row: index of the row, header excluded
+    :type sheet_row: int
+    :param row: cells of the row
+    :type row: list[str]
+    """
+    # read the row data
+    register_date = row[0]
+    leetcode_username = row[1]
+    server_region = row[2]
+    problems_per_week = row[3]
+    start_date = row[4]
+    expire_date = row[5]
+    scheduled_problems = row[6].split()
+    email = row[7]
+    mode = row[8]
+    display_name = row[9] if len(row) > 9 else leetcode_username
+    # check if the member is already in the database
+    member = get_member_data(email, leetcode_username, display_name, register_date, server_region, False)
+    # if member is not valid, skip this member
+    if member is None:
+        return
+    get_schedule_data(
+        member,
+        sheet_row,
+        problems_per_week,
+        start_date,
+        expire_date,
+        mode,
+        scheduled_problems,
+    )
+
+@contextmanager
+def __benchmark_update_lock(wait: float = 0):
+    """
+    Hold the benchmark update lock, shared by all workers through the django cache
+
+    :param wait: seconds to wait for the lock
+    :type wait: float
+
+    :return: context yielding True if the lock is held, False if another run holds it
+    """
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + wait
+    # expires with the celery time limit, in case the worker holding it was killed
+    acquired = cache.add(BENCHMARK_UPDATE_LOCK_CACHE_KEY, token, settings.CELERY_TASK_TIME_LIMIT)
+    while not acquired and time.monotonic() < deadline:
+        time.sleep(1)
+        acquired = cache.add(BENCHMARK_UPDATE_LOCK_CACHE_KEY, token, settings.CELERY_TASK_TIME_LIMIT)
+    try:
+        yield acquired
+    finally:
+        if acquired and cache.get(BENCHMARK_UPDATE_LOCK_CACHE_KEY) == token:
+            cache.delete(BENCHMARK_UPDATE_LOCK_CACHE_KEY)
+
+def update_benchmark(progress: Optional[Callable] = None, members: Optional[list] = None)->None:
+    """
+    Update the ac problems of all members
 
-def update_benchmark()->None:
+    a member that fails is logged and skipped, the other members are still updated
+
+    :param progress: called with (members processed, total members, error message or None) after each member
+    :type progress: Callable or None
+    :param members: members to update, all members if not given
+    :type members: list[Member] or None
+
+    :raises RuntimeError: If another update is still running after BENCHMARK_UPDATE_LOCK_WAIT seconds
+    """
+    with __benchmark_update_lock(BENCHMARK_UPDATE_LOCK_WAIT) as acquired:
+        if not acquired:
+            raise RuntimeError("Another benchmark update is running, try again later")
+        __update_benchmark(progress, members)
+
+def __update_benchmark(progress: Optional[Callable], members: Optional[list])->None:
     # get all member
-    members = Member.objects.all()
-    for member in members:
-        update_ac_problems(member)
+    if members is None:
+        members = list(Member.objects.all())
+    # scrape the recent submissions of all members concurrently, in batched requests
+    recent_submissions = scrape_members_recent_submissions(members)
+    for index, member in enumerate(members):
+        try:
+            update_ac_problems(member, recent_submissions.get((member.server_region, member.leetcode_username)))
+        except Exception as e:
+            logger.exception(f"Failed to update ac problems of member {member.leetcode_username}")
+            if progress is not None:
+                progress(index + 1, len(members), f"member {member.leetcode_username}: {e}")
+            continue
+        if progress is not None:
+            progress(index + 1, len(members), None)
+    logger.info(f"Updated ac problems of {len(members)} members, problem catalog lookups: {get_problem_catalog_stats()}")
+
+def get_poll_interval(last_submission: datetime, now: datetime)->timedelta:
+    """
+    Get the polling interval of a member, active members are polled frequently and dormant ones rarely
+
+    :param last_submission: time of the last ac submission of the member
+    :type last_submission: datetime
+    :param now: current time
+    :type now: datetime
 
+    :return: polling interval
+    :rtype: timedelta
+    """
+    inactive_time = now - last_submission
+    for max_inactive_time, poll_interval in POLL_INTERVALS:
+        if inactive_time <= max_inactive_time:
+            return poll_interval
+    return DORMANT_POLL_INTERVAL
+
+def update_due_benchmark()->int:
+    """
+    Update the ac problems of the members due for polling, then schedule their next poll by activity
+
+    skipped while another update runs, the members stay due for the next call
+
+    :return: number of members polled
+    :rtype: int
+    """
+    with __benchmark_update_lock() as acquired:
+        if not acquired:
+            logger.info("Another benchmark update is running, skip polling the due members")
+            return 0
+        return __update_due_benchmark()
+
+def __update_due_benchmark()->int:
+    now = timezone.now()
+    # the latest ac problem is only needed for members without a watermark yet, annotated to avoid a query per member
+    members = list(Member.objects.filter(Q(next_poll_time__isnull=True) | Q(next_poll_time__lte=now)).annotate(
+        last_ac_time=Max('schedule__problem__done_date', filter=Q(schedule__problem__status=ProblemStatusChoices.AC)),
+    ))
+    if not members:
+        return 0
+    recent_submissions = scrape_members_recent_submissions(members)
+    for member in members:
+        try:
+            update_ac_problems(member, recent_submissions.get((member.server_region, member.leetcode_username)))
+        except Exception:
+            # still scheduled by its last known activity, so one broken member is not polled every run
+            logger.exception(f"Failed to update ac problems of member {member.leetcode_username}")
+        last_submission = member.last_submission_timestamp or member.last_ac_time or member.date_joined
+        member.next_poll_time = now + get_poll_interval(last_submission, now)
+    Member.objects.bulk_update(members, ['next_poll_time'])
+    logger.info(f"Polled {len(members)} due members, problem catalog lookups: {get_problem_catalog_stats()}")
+    return len(members)
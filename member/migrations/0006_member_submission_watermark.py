@@ -0,0 +1,23 @@
+# Generated by Django 4.2.16 on 2026-10-17 12:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("member", "0005_member_is_leetcode_username_public_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="member",
+            name="last_submission_id",
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name="member",
+            name="last_submission_timestamp",
+            field=models.DateTimeField(null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-17 12:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("member", "0006_member_submission_watermark"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="member",
+            name="next_poll_time",
+            field=models.DateTimeField(null=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.16 on 2026-10-17 12:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("member", "0007_member_next_poll_time"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="serveroperations",
+            index=models.Index(fields=["-timestamp"], name="serveroperations_time_idx"),
+        ),
+    ]
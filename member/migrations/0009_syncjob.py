@@ -0,0 +1,65 @@
+# Generated by Django 4.2.16 on 2026-10-17 13:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("member", "0008_serveroperations_timestamp_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SyncJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "job_type",
+                    models.CharField(
+                        choices=[
+                            ("UPDATE_MEMBER", "Update Member"),
+                            ("UPDATE_PROBLEM", "Update Problem"),
+                            ("UPDATE_BENCHMARK", "Update Benchmark"),
+                        ],
+                        max_length=256,
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("PENDING", "Pending"),
+                            ("RUNNING", "Running"),
+                            ("SUCCESS", "Success"),
+                            ("FAILURE", "Failure"),
+                        ],
+                        default="PENDING",
+                        max_length=7,
+                    ),
+                ),
+                ("processed", models.IntegerField(default=0)),
+                ("total", models.IntegerField(null=True)),
+                ("errors", models.JSONField(default=list)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("started_at", models.DateTimeField(null=True)),
+                ("finished_at", models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="syncjob",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("status__in", ["PENDING", "RUNNING"])),
+                fields=("job_type",),
+                name="syncjob_one_in_flight",
+            ),
+        ),
+    ]
@@ -15,6 +15,12 @@ class ServerOperations(models.Model):
     timestamp = models.DateTimeField(auto_now=True,null=False)
     message = models.TextField(null=True)
 
+    class Meta:
+        indexes = [
+            # latest logs on the benchmark page
+            models.Index(fields=["-timestamp"], name="serveroperations_time_idx"),
+        ]
+
     def __str__(self):
         return f"[{self.timestamp}] {self.operation_name}: {self.message}" 
     
@@ -52,6 +58,11 @@ class Member(models.Model):
     is_leetcode_username_public = models.BooleanField(default=False,null=False)
     # motto = models.CharField(max_length=100, blank=True, null=True)
     credit_remains = models.IntegerField(default=0, null=False)
+    # watermark of the newest leetcode ac submission already processed
+    last_submission_id = models.BigIntegerField(null=True)
+    last_submission_timestamp = models.DateTimeField(null=True)
+    # when the member should be polled next, None means due now
+    next_poll_time = models.DateTimeField(null=True)
 
     # last_login and date_joined automatically created by user_id, for these field, create one time value to timezone.now()
     # The field is only automatically updated when calling Model.save().
@@ -64,3 +75,37 @@ class Member(models.Model):
         return f"{self.user_id.username}-{self.leetcode_username}[{self.server_region}]: {self.credit_remains}"
     
     
+
+class SyncJobStatusChoices(models.TextChoices):
+    """Sync job status choices"""
+    PENDING = "PENDING", _("Pending")
+    RUNNING = "RUNNING", _("Running")
+    SUCCESS = "SUCCESS", _("Success")
+    FAILURE = "FAILURE", _("Failure")
+
+class SyncJob(models.Model):
+    """A run of update_benchmark or update_member_data in celery, polled by the status endpoint"""
+
+    job_type = models.CharField(choices=ServerOperationChoices.choices,null=False,max_length=256)
+    status = models.CharField(choices=SyncJobStatusChoices.choices,default=SyncJobStatusChoices.PENDING,null=False,max_length=7)
+    # members or sheet rows processed so far, out of total once known
+    processed = models.IntegerField(default=0,null=False)
+    total = models.IntegerField(null=True)
+    # one message per member or sheet row that failed
+    errors = models.JSONField(default=list,null=False)
+    created_at = models.DateTimeField(auto_now_add=True,null=False)
+    started_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
+
+    class Meta:
+        constraints = [
+            # at most one run of each type in flight
+            models.UniqueConstraint(
+                fields=["job_type"],
+                condition=models.Q(status__in=["PENDING", "RUNNING"]),
+                name="syncjob_one_in_flight",
+            ),
+        ]
+
+    def __str__(self):
+        return f"[{self.created_at}] {self.job_type}: {self.status} {self.processed}/{self.total}"
@@ -0,0 +1,127 @@
+"""
+This file is used to run update_benchmark and update_member_data as celery jobs, tracked by SyncJob
+
+the sync endpoints only enqueue a job and return its id, so their latency does not depend on the scrape
+"""
+
+from datetime import timedelta
+import os
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from member.googlesheet_parser import update_benchmark, update_member_data
+from member.googlesheet_scraper import GoogleSheetScraper
+from member.models import ServerOperationChoices, SyncJob, SyncJobStatusChoices
+
+# import logging
+import logging
+logger = logging.getLogger(__name__)
+
+# jobs running for longer than the celery time limit were killed with their worker
+SYNC_JOB_STALE_AFTER = timedelta(seconds=settings.CELERY_TASK_TIME_LIMIT)
+IN_FLIGHT_STATUSES = [SyncJobStatusChoices.PENDING, SyncJobStatusChoices.RUNNING]
+
+def __expire_stale_jobs(job_type: str)->None:
+    # pending jobs age from their creation, running ones from their start, a job may wait long in the queue
+    now = timezone.now()
+    SyncJob.objects.filter(
+        Q(status=SyncJobStatusChoices.PENDING, created_at__lt=now - SYNC_JOB_STALE_AFTER) |
+        Q(status=SyncJobStatusChoices.RUNNING, started_at__lt=now - SYNC_JOB_STALE_AFTER),
+        job_type=job_type,
+    ).update(status=SyncJobStatusChoices.FAILURE, finished_at=now)
+
+def start_sync_job(job_type: str)->tuple:
+    """
+    Enqueue a sync job, unless one of the same type is already in flight
+
+    :param job_type: ServerOperationChoices.UPDATE_BENCHMARK or ServerOperationChoices.UPDATE_MEMBER
+    :type job_type: str
+
+    :return: the job, and whether it was created by this call
+    :rtype: tuple[SyncJob, bool]
+    """
+    __expire_stale_jobs(job_type)
+    try:
+        # the partial unique constraint allows one pending or running job per type
+        with transaction.atomic():
+            job = SyncJob.objects.create(job_type=job_type)
+    except IntegrityError:
+        job = SyncJob.objects.filter(job_type=job_type, status__in=IN_FLIGHT_STATUSES).first()
+        if job is not None:
+            return job, False
+        # the job in flight finished meanwhile
+        job = SyncJob.objects.create(job_type=job_type)
+    # imported here, the tasks module imports this one
+    from member.tasks import run_sync_job_task
+    try:
+        run_sync_job_task.delay(job.id)
+    except Exception as e:
+        logger.exception(f"Failed to enqueue sync job {job.id}")
+        SyncJob.objects.filter(id=job.id).update(
+            status=SyncJobStatusChoices.FAILURE, errors=[f"enqueue: {e}"], finished_at=timezone.now(),
+        )
+        job.refresh_from_db()
+    return job, True
+
+def run_sync_job(job_id: int)->None:
+    """
+    Run a sync job, recording its progress and the errors of single members or sheet rows
+
+    :param job_id: id of the SyncJob
+    :type job_id: int
+    """
+    job = SyncJob.objects.get(id=job_id)
+    # claimed only if still pending, the job may have expired while it waited in the queue
+    if not SyncJob.objects.filter(id=job_id, status=SyncJobStatusChoices.PENDING).update(status=SyncJobStatusChoices.RUNNING, started_at=timezone.now()):
+        job.refresh_from_db()
+        logger.warning(f"Sync job {job_id} is {job.status}, not running it")
+        return
+    # updates only apply while the job runs, an expired job keeps its failure
+    running_job = SyncJob.objects.filter(id=job_id, status=SyncJobStatusChoices.RUNNING)
+    errors = []
+
+    def progress(processed, total, error=None):
+        if error is not None:
+            errors.append(error)
+        running_job.update(processed=processed, total=total, errors=errors)
+
+    try:
+        if job.job_type == ServerOperationChoices.UPDATE_BENCHMARK:
+            update_benchmark(progress=progress)
+        elif job.job_type == ServerOperationChoices.UPDATE_MEMBER:
+            update_member_data(GoogleSheetScraper(os.getenv("GOOGLE_SHEET_ID"), os.getenv("GOOGLE_API_KEY")), progress=progress)
+        else:
+            raise ValueError(f"Unknown sync job type {job.job_type}")
+    except Exception as e:
+        logger.exception(f"Sync job {job_id} failed")
+        errors.append(str(e))
+        running_job.update(status=SyncJobStatusChoices.FAILURE, errors=errors, finished_at=timezone.now())
+        return
+    if not running_job.update(status=SyncJobStatusChoices.SUCCESS, finished_at=timezone.now()):
+        logger.warning(f"Sync job {job_id} finished after it expired, its failure is kept")
+        return
+    logger.info(f"Sync job {job_id} finished with {len(errors)} errors")
+
+def sync_job_status(job: SyncJob)->dict:
+    """
+    :return: json serializable status of the job, elapsed time is counted until now while it runs
+    :rtype: dict
+    """
+    elapsed = None
+    if job.started_at is not None:
+        elapsed = ((job.finished_at or timezone.now()) - job.started_at).total_seconds()
+    return {
+        'job_id': job.id,
+        'job_type': job.job_type,
+        'status': job.status,
+        'processed': job.processed,
+        'total': job.total,
+        'errors': job.errors,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'elapsed_seconds': elapsed,
+    }
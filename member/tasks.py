@@ -1,23 +1,32 @@
 # Create your tasks here
 
-import os
-from member.googlesheet_parser import update_member_data, update_benchmark
-
-from celery import shared_task
-
-import os
 from celery import shared_task
-from member.googlesheet_scraper import GoogleSheetScraper
-from member.googlesheet_parser import update_member_data
+from member.googlesheet_parser import update_due_benchmark
+from member.models import ServerOperationChoices
+from member.sync_jobs import run_sync_job, start_sync_job
 from main.celery import app  # Import the Celery app
 
 @shared_task
 def update_member_data_task():
-    update_member_data(GoogleSheetScraper(os.getenv("GOOGLE_SHEET_ID"), os.getenv("GOOGLE_API_KEY")))
+    # tracked like the runs started from the sync endpoint, skipped while one is in flight
+    start_sync_job(ServerOperationChoices.UPDATE_MEMBER)
+
+@shared_task
+def run_sync_job_task(job_id):
+    run_sync_job(job_id)
+
+@shared_task
+def update_due_benchmark_task():
+    update_due_benchmark()
 
 # Register the task to run every 10 minutes (600 seconds)
 app.conf.beat_schedule = app.conf.get('beat_schedule', {})
 app.conf.beat_schedule['update_member_data_task'] = {
     'task': 'member.tasks.update_member_data_task',
     'schedule': 600.0,
+}
+# Poll the members that are due every 5 minutes (300 seconds), each member is polled at its own interval
+app.conf.beat_schedule['update_due_benchmark_task'] = {
+    'task': 'member.tasks.update_due_benchmark_task',
+    'schedule': 300.0,
 }
\ No newline at end of file
@@ -1,3 +1,117 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from check.models import Problem, ProblemCatalog, ProblemStatusChoices, Schedule, ScheduleTypeChoices
+from member.googlesheet_parser import BENCHMARK_UPDATE_LOCK_CACHE_KEY, update_due_benchmark
+from member.models import Member, ServerOperationChoices, SyncJob, SyncJobStatusChoices
+from member.sync_jobs import run_sync_job
+
+class DueBenchmarkTests(TestCase):
+
+    def poll_queries(self):
+        Member.objects.update(next_poll_time=None)
+        with mock.patch('member.googlesheet_parser.scrape_members_recent_submissions', return_value={}), \
+                mock.patch('member.googlesheet_parser.update_ac_problems'), \
+                CaptureQueriesContext(connection) as queries:
+            update_due_benchmark()
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_members(self):
+        ProblemCatalog.objects.create(problem_code=1, problem_title='Problem 1', problem_slug='problem-1')
+        for index in range(3):
+            member = Member.objects.create(user_id=User.objects.create_user(username=f'member{index}'), leetcode_username=f'member{index}')
+            schedule = Schedule.objects.create(member_id=member, schedule_type=ScheduleTypeChoices.FREE, goals=65535)
+            Problem.objects.create(schedule_id=schedule, catalog_id_id=1, status=ProblemStatusChoices.AC, done_date=timezone.now() - timedelta(days=100 * index))
+            if index == 0:
+                queries = self.poll_queries()
+        self.assertEqual(self.poll_queries(), queries)
+        # members active 100 days ago are polled less often than the member active today
+        next_poll_times = dict(Member.objects.values_list('leetcode_username', 'next_poll_time'))
+        self.assertLess(next_poll_times['member0'], next_poll_times['member1'])
+
+    def test_failing_member_does_not_stop_the_others(self):
+        for index in range(2):
+            Member.objects.create(user_id=User.objects.create_user(username=f'member{index}'), leetcode_username=f'member{index}')
+
+        def update_ac_problems(member, ac_problems):
+            if member.leetcode_username == 'member0':
+                raise ValueError('broken account')
+
+        with mock.patch('member.googlesheet_parser.scrape_members_recent_submissions', return_value={}), \
+                mock.patch('member.googlesheet_parser.update_ac_problems', update_ac_problems):
+            self.assertEqual(update_due_benchmark(), 2)
+        self.assertFalse(Member.objects.filter(next_poll_time__isnull=True).exists())
+
+    def test_skipped_while_another_update_runs(self):
+        Member.objects.create(user_id=User.objects.create_user(username='member'), leetcode_username='member')
+        cache.set(BENCHMARK_UPDATE_LOCK_CACHE_KEY, 'other run')
+        self.addCleanup(cache.delete, BENCHMARK_UPDATE_LOCK_CACHE_KEY)
+        with mock.patch('member.googlesheet_parser.scrape_members_recent_submissions') as scrape:
+            self.assertEqual(update_due_benchmark(), 0)
+        scrape.assert_not_called()
+        self.assertTrue(Member.objects.filter(next_poll_time__isnull=True).exists())
+
+class SyncJobTests(TestCase):
+
+    def test_sync_endpoint_enqueues_once(self):
+        with mock.patch('member.tasks.run_sync_job_task.delay') as delay:
+            first = self.client.get(reverse('check:get_ac_data'))
+            second = self.client.get(reverse('check:get_ac_data'))
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual(second.json()['job_id'], first.json()['job_id'])
+        delay.assert_called_once_with(first.json()['job_id'])
+
+        SyncJob.objects.filter(id=first.json()['job_id']).update(status=SyncJobStatusChoices.SUCCESS)
+        with mock.patch('member.tasks.run_sync_job_task.delay'):
+            third = self.client.get(reverse('check:get_ac_data'))
+        self.assertNotEqual(third.json()['job_id'], first.json()['job_id'])
+
+    def test_status_reports_progress_and_errors(self):
+        job = SyncJob.objects.create(job_type=ServerOperationChoices.UPDATE_BENCHMARK)
+
+        def update_benchmark(progress):
+            progress(1, 2, None)
+            progress(2, 2, 'member broken: timeout')
+
+        with mock.patch('member.sync_jobs.update_benchmark', update_benchmark):
+            run_sync_job(job.id)
+        status = self.client.get(reverse('check:sync_job', args=[job.id])).json()
+        self.assertEqual(status['status'], SyncJobStatusChoices.SUCCESS)
+        self.assertEqual((status['processed'], status['total']), (2, 2))
+        self.assertEqual(status['errors'], ['member broken: timeout'])
+        self.assertIsNotNone(status['elapsed_seconds'])
+        self.assertEqual(self.client.get(reverse('check:sync_job', args=[job.id + 1])).status_code, 404)
+
+    def test_job_that_waited_in_the_queue_is_not_expired(self):
+        job = SyncJob.objects.create(job_type=ServerOperationChoices.UPDATE_BENCHMARK)
+        SyncJob.objects.filter(id=job.id).update(
+            status=SyncJobStatusChoices.RUNNING, created_at=timezone.now() - timedelta(hours=2), started_at=timezone.now(),
+        )
+        with mock.patch('member.tasks.run_sync_job_task.delay') as delay:
+            response = self.client.get(reverse('check:get_ac_data'))
+        self.assertEqual(response.json()['job_id'], job.id)
+        delay.assert_not_called()
+
+    def test_expired_job_keeps_its_failure(self):
+        job = SyncJob.objects.create(job_type=ServerOperationChoices.UPDATE_BENCHMARK)
+
+        def update_benchmark(progress):
+            # the job outlives the time limit, and a new request expires it meanwhile
+            SyncJob.objects.filter(id=job.id).update(started_at=timezone.now() - timedelta(hours=2))
+            with mock.patch('member.tasks.run_sync_job_task.delay'):
+                self.client.get(reverse('check:get_ac_data'))
+            progress(1, 1, None)
 
-# Create your tests here.
+        with mock.patch('member.sync_jobs.update_benchmark', update_benchmark):
+            run_sync_job(job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.status, SyncJobStatusChoices.FAILURE)
+        self.assertEqual(job.processed, 0)